@@ -7,15 +7,6 @@ In a directed graph, we want to find (if it exists) a node with incoming edges f
 from random import randrange
 import numpy as np
 
-n=100
-p = 0.5 # sets T/F selection probability
-#G = [[randrange(2) for i in range(n)] for i in range(n)] # crude random graph
-G = np.random.choice(a=[False, True], size=(n,n), p=[p,1-p])# Crude Boolean random graph
-c = randrange(n) # set celebrity
-for i in range(n):
-    G[i][c] = True # incoming connection
-    G[c][i] = False # no outgoing connection
-
 #Naive algorithm
 def naive_celeb(G):
     n = len(G)
@@ -28,8 +19,11 @@ def naive_celeb(G):
             return u # no breaks - found celebrity
     return None
 
-#Efficient algorithm
-def celeb(G):
+#Efficient algorithm. G may also be a "knows" oracle, called as G(u, v), for relations too large to hold as a matrix (n must then be given)
+def celeb(G, n=None):
+    if callable(G):
+        if n is None: raise ValueError('n must be given for an oracle')
+        return celeb_oracle(G, n)
     n = len(G)
     u, v = 0, 1 # starting indices
     for c in range(2,n+1):
@@ -46,5 +40,96 @@ def celeb(G):
         return c
     return None
 
-print naive_celeb(G)
-print celeb(G)
+#Adjacency oracle: wraps a function knows(u, v) (e.g. a lookup into a lazily loaded store), caches every answer it fetches and accounts for the
+#cost of each call that is not cached. cost is either a constant or a function cost(u, v)
+class KnowsOracle(object):
+
+    def __init__(self, knows, cost=1):
+        self.knows = knows
+        self.cost = cost
+        self.cache = {} # (u, v) -> answer, for every pair fetched so far
+        self.queries = 0 # number of calls to knows
+        self.total_cost = 0
+
+    def __call__(self, u, v):
+        try:
+            return self.cache[u, v]
+        except KeyError:
+            pass
+        ans = bool(self.knows(u, v))
+        self.cache[u, v] = ans
+        self.queries += 1
+        self.total_cost += self.cost(u, v) if callable(self.cost) else self.cost
+        return ans
+
+#Efficient algorithm over an oracle knows(u, v) for n people, with O(n) memory. The elimination asks n-1 questions, and verifying the candidate asks
+#at most 2(n-1) more, minus any already answered during the elimination (they come from the cache), so at most 3n-3 calls in all
+def celeb_oracle(knows, n):
+    if not isinstance(knows, KnowsOracle): knows = KnowsOracle(knows)
+    if n == 0: return None
+    u, v = 0, 1
+    for c in range(2,n+1):
+        if knows(u, v): u = c
+        else: v = c
+    c = v if u == n else u
+    for v in range(n):
+        if c == v: continue
+        if knows(c, v): return None
+        if not knows(v, c): return None
+    return c
+
+#Efficient algorithm for NumPy Boolean adjacency matrices
+'''celeb indexes G[u][v] from Python, which creates a temporary row view at every step. Here the elimination reads single elements straight from the
+array buffer with G.item(u, v), and the O(n) verification of the candidate becomes two reductions: row c must contain no True (other than the
+diagonal) and column c must be all True (other than the diagonal)'''
+def celeb_np(G):
+    n = G.shape[0]
+    if n == 0: return None
+    item = G.item
+    u, v = 0, 1
+    for c in range(2,n+1):
+        if item(u, v): u = c
+        else: v = c
+    c = v if u == n else u
+    diag = G.item(c, c)
+    if np.count_nonzero(G[c,:]) - diag > 0: return None # c knows someone
+    if np.count_nonzero(G[:,c]) - diag < n-1: return None # someone does not know c
+    return c
+
+#Batched version for a stack of k independent n x n matrices (shape (k, n, n)). The elimination runs in lockstep over the stack, one vectorised step
+#per c, and the verification is a pair of reductions over all k candidate rows and columns. Returns an array of k celebrities (-1 where there is none)
+def celeb_batch(Gs):
+    k, n = Gs.shape[0], Gs.shape[1]
+    if n == 0: return np.full(k, -1, dtype=np.intp)
+    b = np.arange(k)
+    u = np.zeros(k, dtype=np.intp)
+    v = np.ones(k, dtype=np.intp)
+    for c in range(2,n+1):
+        knows = Gs[b, u, v]
+        u = np.where(knows, c, u) # u knows v, u cannot be celebrity
+        v = np.where(knows, v, c) # v is unknown by u, v cannot be celebrity
+    cand = np.where(u == n, v, u)
+    diag = Gs[b, cand, cand].astype(np.intp)
+    ok = (np.count_nonzero(Gs[b, cand, :], axis=1) - diag == 0) & (np.count_nonzero(Gs[b, :, cand], axis=1) - diag == n-1)
+    return np.where(ok, cand, -1)
+
+if __name__ == '__main__':
+    n=100
+    p = 0.5 # sets T/F selection probability
+    #G = [[randrange(2) for i in range(n)] for i in range(n)] # crude random graph
+    G = np.random.choice(a=[False, True], size=(n,n), p=[p,1-p])# Crude Boolean random graph
+    c = randrange(n) # set celebrity
+    for i in range(n):
+        G[i][c] = True # incoming connection
+        G[c][i] = False # no outgoing connection
+
+    print naive_celeb(G)
+    print celeb(G)
+    print celeb_np(G)
+    Gs = np.random.choice(a=[False, True], size=(4,n,n), p=[p,1-p]) # stack of random graphs, with a celebrity in the first two
+    for i in range(2):
+        Gs[i,:,i+1] = True
+        Gs[i,i+1,:] = False
+    print celeb_batch(Gs)
+    oracle = KnowsOracle(lambda u, v: G[u][v]) # stands in for an oracle that is too large to materialise
+    print celeb(oracle, n), oracle.queries, 3*n-3
@@ -6,9 +6,16 @@ The strategy is to split the board into 4 quarters, and for 3 of these subboards
 subboards can be entirely covered (completely), leaving the fourth to be divided into quarters again. The base case is four-square
 boards. At the end of the algorithm there are therefore 3 squares left to cover in a L-shape.
 The side lengths of the board must be 2^k where k is an integer.
+The same strategy works for a missing square anywhere on the board: the tile at each split goes on the three centre squares of the quarters that do
+not contain the missing square (or a square already covered). checkerboard_np handles this general case, and checkerboard_parallel tiles the four
+top-level quarters in separate processes.
 '''
 
-from random import randint
+from random import randint, randrange
+from timeit import default_timer
+import ctypes
+from multiprocessing import Pool, RawArray
+import numpy as np
 
 def checkerboard(board,lab=1,top=0,left=0,side=None):
     if side is None: side = len(board)
@@ -29,15 +36,140 @@ def checkerboard(board,lab=1,top=0,left=0,side=None):
     # Return the next available label
     return lab
 
+# Iterative version on a NumPy int32 board, with one square already filled (the missing square, marked -1), which may be anywhere on the board.
+# For a missing corner it produces exactly the same tiling and labels as checkerboard.
+'''checkerboard visits the subboards depth first, but the corners it tests only ever depend on tiles placed at shallower levels, so all subboards of
+the same size can be processed together. At the level with subboard side `side`, the corner cells of every subboard form the strided view
+board[dy::side, dx::side], and the matching centre cells board[s+dy'::side, s+dx'::side]; one masked copy per corner places the tiles of the whole
+level. Every subboard has exactly one filled cell at one of its corners (the centre square covered by its parent's tile), except the single subboard
+per level that contains the missing square, which gets its tile separately. The labels follow the depth-first (pre-order) numbering of
+checkerboard: the four children of a subboard with label l get labels l + 1 + q*T, q = 0...3, where T = (4^(levels below) - 1)/3 is the number of
+subboards (labels) in each child's subtree'''
+def checkerboard_np(board, lab=1, missing=None):
+    z = board.shape[0]
+    k = z.bit_length() - 1 # number of levels, z = 2^k
+    if missing is None:
+        filled = np.flatnonzero(board)
+        if len(filled) != 1:
+            raise ValueError('board must have exactly one missing square')
+        missing = divmod(int(filled[0]), z)
+    row, col = missing
+    n_labels = (4**k - 1) // 3
+    dtype = np.int32 if lab + n_labels < 2**31 else np.int64
+    labels = np.full((1, 1), lab, dtype=dtype) # label of each subboard at the current level
+    side = z
+    for d in range(k):
+        s = side // 2
+        i, j = row // side, col // side # subboard containing the missing square
+        offsets = (0, -1), (side - 1, 0) # offsets for outer/inner squares of subboards
+        for dy_outer, dy_inner in offsets:
+            for dx_outer, dx_inner in offsets:
+                empty = board[dy_outer::side, dx_outer::side] == 0
+                empty[i, j] = False
+                np.copyto(board[s + dy_inner::side, s + dx_inner::side], labels, where=empty)
+        # tile of the subboard with the missing square: the centre squares of the three quarters that do not contain it
+        top, left = i*side, j*side
+        quarter = (row - top >= s, col - left >= s)
+        for a in range(2):
+            for b in range(2):
+                if (a, b) != quarter:
+                    board[top + s - 1 + a, left + s - 1 + b] = labels[i, j]
+        if s > 1:
+            T = (4**(k - d - 1) - 1) // 3 # subboards in the subtree of each child
+            m = labels.shape[0]
+            children = np.empty((2*m, 2*m), dtype=dtype)
+            for a in range(2):
+                for b in range(2):
+                    children[a::2, b::2] = labels + (1 + (2*a + b)*T)
+            labels = children
+        side = s
+    # Return the next available label
+    return lab + n_labels
+
+# Parallel version: the top-level tile is placed first, after which the four quarters are independent problems (each with one filled square). They
+# are tiled by a pool of processes, all writing into one board in shared memory. Quarter q takes the labels lab + 1 + q*T onwards, the same offsets
+# as in the depth-first numbering, so labels are globally unique and the result is identical to checkerboard_np. Returns (board, next label)
+_shared = {}
+
+def _init_shared(raw, z):
+    _shared['board'] = np.frombuffer(raw, dtype=np.int32).reshape(z, z)
+
+def _tile_quarter(task):
+    top, left, s, lab = task
+    checkerboard_np(_shared['board'][top:top+s, left:left+s], lab)
+
+def checkerboard_parallel(z, missing, lab=1, processes=4):
+    k = z.bit_length() - 1
+    raw = RawArray(ctypes.c_int32, z*z)
+    board = np.frombuffer(raw, dtype=np.int32).reshape(z, z)
+    board[missing] = -1
+    s = z // 2
+    quarter = (missing[0] >= s, missing[1] >= s)
+    for a in range(2):
+        for b in range(2):
+            if (a, b) != quarter:
+                board[s - 1 + a, s - 1 + b] = lab
+    T = (4**(k - 1) - 1) // 3
+    tasks = [(a*s, b*s, s, lab + 1 + (2*a + b)*T) for a in range(2) for b in range(2)]
+    pool = Pool(processes, initializer=_init_shared, initargs=(raw, z))
+    try:
+        pool.map(_tile_quarter, tasks)
+    finally:
+        pool.close()
+        pool.join()
+    return board, lab + (4**k - 1) // 3
+
+
+if __name__ == '__main__':
+    #Driver code
+    z = 8 # board length (must be = 2^k)
+    board = [[0]*z for i in range(z)] # initialise board
+    #set missing corner at random
+    cornerindex = (0, z-1)
+    r1 = randint(0,1)
+    r2 = randint(0,1)
+    board[cornerindex[r1]][cornerindex[r2]] = -1
+    board_np = np.array(board, dtype=np.int32) # copy of the initial board, for the iterative version
+    lab = checkerboard(board)
+    for row in board:
+        print ((" %2i"*z) % tuple(row))
+    lab_np = checkerboard_np(board_np)
+    print (lab == lab_np and (board_np == np.array(board)).all())
+
+    #Timing of the recursive and iterative versions on larger boards
+    for k in (8, 10):
+        z = 2**k
+        board = [[0]*z for i in range(z)]
+        board[0][0] = -1
+        board_np = np.array(board, dtype=np.int32)
+        t = default_timer()
+        checkerboard(board)
+        t_rec = default_timer() - t
+        t = default_timer()
+        checkerboard_np(board_np)
+        t_np = default_timer() - t
+        print ("z = 2^%i: recursive %.3f s, iterative %.4f s" % (k, t_rec, t_np))
+
+    #Missing square anywhere on the board
+    z = 8
+    missing = (randrange(z), randrange(z))
+    board_np = np.zeros((z, z), dtype=np.int32)
+    board_np[missing] = -1
+    checkerboard_np(board_np)
+    for row in board_np:
+        print ((" %2i"*z) % tuple(row))
+    board_par, lab_par = checkerboard_parallel(z, missing)
+    print ((board_par == board_np).all())
 
-#Driver code
-z = 8 # board length (must be = 2^k)
-board = [[0]*z for i in range(z)] # initialise board
-#set missing corner at random
-cornerindex = (0, z-1)
-r1 = randint(0,1)
-r2 = randint(0,1)
-board[cornerindex[r1]][cornerindex[r2]] = -1
-lab = checkerboard(board)
-for row in board:
-    print ((" %2i"*z) % tuple(row))
+    #Timing of the serial and parallel iterative versions
+    z = 2**12
+    missing = (randrange(z), randrange(z))
+    board_np = np.zeros((z, z), dtype=np.int32)
+    board_np[missing] = -1
+    t = default_timer()
+    checkerboard_np(board_np)
+    t_np = default_timer() - t
+    t = default_timer()
+    board_par, lab_par = checkerboard_parallel(z, missing)
+    t_par = default_timer() - t
+    print ("z = 2^12: serial %.3f s, 4 processes %.3f s, same result: %s" % (t_np, t_par, (board_par == board_np).all()))
@@ -4,18 +4,125 @@ Python class for constructing a random directed acyclic graph (DAG)
 
 from copy import copy, deepcopy
 from collections import deque
+from array import array
+import mmap
+import pickle
+import random
+import struct
 try:
     from collections import OrderedDict
 except ImportError:
     from ordereddict import OrderedDict
+try:
+    import numpy as np
+except ImportError:
+    np = None
+try:
+    xrange
+except NameError:
+    xrange = range
 
 class Dag(object):
 
-    def __init__(self):
+    # if online_order is True, a topological order of the graph is maintained as edges are added (see add_edge)
+    def __init__(self, online_order=False):
+        self.online_order = online_order
         self.reset_graph()
 
     def reset_graph(self):
         self.graph = OrderedDict()
+        self.reverse = OrderedDict() # reverse-edge index: node -> set of its predecessors (for self.graph only)
+        self.order = [] # online topological order (position -> node), if self.online_order
+        self.position = {} # node -> position in self.order
+        self.reach_index = None # cached ReachabilityIndex, built on demand by is_upstream
+
+    # Bulk constructor from an iterable of (ind_node, dep_node) tuples, or from an (m, 2) NumPy array (see
+    # from_arrays). If nodes is given, every edge must be between those nodes (KeyError otherwise); if not, the nodes
+    # are taken in order of first appearance. The adjacency and reverse-edge index are filled in a single sweep
+    # over the edges, rather than through add_edge
+    @classmethod
+    def from_edges(cls, edges, nodes=None, online_order=False):
+        if np is not None and isinstance(edges, np.ndarray):
+            return cls.from_arrays(edges[:, 0], edges[:, 1], nodes, online_order)
+        dag = cls()
+        graph, reverse = dag.graph, dag.reverse
+        if nodes is not None:
+            for node in nodes:
+                graph[node] = set()
+                reverse[node] = set()
+        for ind_node, dep_node in edges:
+            if ind_node not in graph or dep_node not in graph:
+                if nodes is not None:
+                    raise KeyError("Attempting to add edge involving one or more nonexistent nodes")
+                for node in (ind_node, dep_node):
+                    if node not in graph:
+                        graph[node] = set()
+                        reverse[node] = set()
+            graph[ind_node].add(dep_node)
+            reverse[dep_node].add(ind_node)
+        if online_order:
+            dag.enable_online_order()
+        return dag
+
+    # Bulk constructor from two NumPy arrays of equal length, holding the ind_node and dep_node of each edge.
+    # Membership of the endpoints in nodes is checked in one vectorised pass, and each node's set of downstreams
+    # (and of predecessors) is built from a contiguous slice of the edges sorted by source (and by target)
+    @classmethod
+    def from_arrays(cls, ind_nodes, dep_nodes, nodes=None, online_order=False):
+        ind_nodes, dep_nodes = np.asarray(ind_nodes), np.asarray(dep_nodes)
+        if ind_nodes.shape != dep_nodes.shape or ind_nodes.ndim != 1:
+            raise ValueError('edge arrays must be one-dimensional and of equal length')
+        if nodes is None:
+            # nodes in order of first appearance in the edge list
+            both = np.column_stack((ind_nodes, dep_nodes)).ravel()
+            uniq, first = np.unique(both, return_index=True)
+            nodes = uniq[np.argsort(first, kind='mergesort')].tolist()
+        else:
+            nodes = list(nodes)
+            if not (np.isin(ind_nodes, nodes).all() and np.isin(dep_nodes, nodes).all()):
+                raise KeyError("Attempting to add edge involving one or more nonexistent nodes")
+        dag = cls()
+        for node in nodes:
+            dag.graph[node] = set()
+            dag.reverse[node] = set()
+        for adjacency, keys, values in ((dag.graph, ind_nodes, dep_nodes), (dag.reverse, dep_nodes, ind_nodes)):
+            perm = np.argsort(keys, kind='mergesort')
+            keys, values = keys[perm], values[perm]
+            bounds = np.flatnonzero(keys[1:] != keys[:-1]) + 1
+            starts = [0] + bounds.tolist()
+            ends = bounds.tolist() + [len(keys)]
+            for node, a, b in zip(keys[starts].tolist() if len(keys) else [], starts, ends):
+                adjacency[node].update(values[a:b].tolist())
+        if online_order:
+            dag.enable_online_order()
+        return dag
+
+    # Bulk constructor from a text file (path or open file) with one edge "ind_node dep_node" per line. Blank lines
+    # and lines starting with '#' are skipped; node names are converted with node_type. The file is streamed
+    @classmethod
+    def from_file(cls, f, nodes=None, node_type=int, online_order=False):
+        if isinstance(f, str):
+            with open(f) as fh:
+                return cls.from_file(fh, nodes, node_type, online_order)
+        edges = (line.split() for line in f if line.strip() and not line.lstrip().startswith('#'))
+        return cls.from_edges(((node_type(u), node_type(v)) for u, v in edges), nodes, online_order)
+
+    # switches on online topological order maintenance, starting from a full sort of the current graph.
+    # Raises ValueError if the graph is not acyclic
+    def enable_online_order(self):
+        self.order = self.topological_sort()
+        self.position = dict((node, i) for i, node in enumerate(self.order))
+        self.online_order = True
+
+    # True if the reverse-edge index can be used for the given graph
+    def _indexed(self, graph):
+        return graph is None or graph is self.graph
+
+    # returns an immutable, array-backed (CSR) copy of the graph for querying
+    def freeze(self, graph=None):
+        if graph is None:
+            graph = self.graph
+        return FrozenDag.from_graph(graph)
 
     def add_node(self, node_name, graph=None):
         if not graph:
@@ -23,18 +130,96 @@ class Dag(object):
         if node_name in graph:
             raise KeyError("node %s already exists" % node_name)
         graph[node_name] = set()
+        if graph is self.graph:
+            self.reverse[node_name] = set()
+            if self.online_order:
+                self.position[node_name] = len(self.order)
+                self.order.append(node_name)
+            if self.reach_index is not None and not self.reach_index.add_node(node_name):
+                self.reach_index = None
 
     def add_edge(self, ind_node, dep_node, graph=None):
         if not graph:
             graph = self.graph
         if ind_node not in graph or dep_node not in graph:
             raise KeyError("Attempting to add edge involving one or more nonexistent nodes")
+        if graph is self.graph and self.online_order:
+            if ind_node == dep_node:
+                raise ValueError("adding edge %s -> %s would create a cycle" % (ind_node, dep_node))
+            if self.position[ind_node] > self.position[dep_node]:
+                self._reorder(ind_node, dep_node)
         graph[ind_node].add(dep_node)
+        if graph is self.graph:
+            self.reverse[dep_node].add(ind_node)
+            if self.reach_index is not None and not self.reach_index.add_edge(ind_node, dep_node, self.reverse):
+                self.reach_index = None
 
-    # returns a list of all predecessors of the given node
-    def predecessors(self, node, graph=None):
-        if graph is None:
+    def delete_edge(self, ind_node, dep_node, graph=None):
+        if not graph:
             graph = self.graph
+        if dep_node not in graph.get(ind_node, ()):
+            raise KeyError("edge %s -> %s does not exist" % (ind_node, dep_node))
+        graph[ind_node].remove(dep_node)
+        if graph is self.graph:
+            self.reverse[dep_node].remove(ind_node)
+            self.reach_index = None
+
+    # deletes a node along with all edges into and out of it
+    def delete_node(self, node_name, graph=None):
+        if not graph:
+            graph = self.graph
+        if node_name not in graph:
+            raise KeyError('node %s is not in graph' % node_name)
+        for dep_node in list(graph[node_name]):
+            self.delete_edge(node_name, dep_node, graph)
+        for ind_node in self.predecessors(node_name, graph):
+            self.delete_edge(ind_node, node_name, graph)
+        del graph[node_name]
+        if graph is self.graph:
+            del self.reverse[node_name]
+            self.reach_index = None
+            if self.online_order: # close the gap in the order, O(V)
+                i = self.position.pop(node_name)
+                del self.order[i]
+                for j in range(i, len(self.order)):
+                    self.position[self.order[j]] = j
+
+    # Pearce-Kelly update of the online topological order for a new edge x -> y, where y currently precedes x.
+    # Only the affected region, i.e. nodes with positions between those of y and x, is visited: the nodes reachable
+    # from y (delta_f) and the nodes that reach x (delta_b) are moved so that all of delta_b precedes all of delta_f,
+    # reusing the same set of positions. Raises ValueError (leaving the graph unchanged) if x is reachable from y
+    def _reorder(self, x, y):
+        position = self.position
+        lb, ub = position[y], position[x]
+        delta_f = self._bounded_search(y, self.graph, lambda w: position[w] <= ub)
+        if x in delta_f:
+            raise ValueError("adding edge %s -> %s would create a cycle" % (x, y))
+        delta_b = self._bounded_search(x, self.reverse, lambda w: position[w] > lb)
+        delta_b = sorted(delta_b, key=position.__getitem__)
+        delta_f = sorted(delta_f, key=position.__getitem__)
+        slots = sorted(position[w] for w in delta_b + delta_f)
+        for w, i in zip(delta_b + delta_f, slots):
+            position[w] = i
+            self.order[i] = w
+
+    # iterative depth-first search from start along the given adjacency, restricted to nodes w with inside(w)
+    def _bounded_search(self, start, adjacency, inside):
+        seen = set([start])
+        stack = [start]
+        while stack:
+            u = stack.pop()
+            for w in adjacency[u]:
+                if w not in seen and inside(w):
+                    seen.add(w)
+                    stack.append(w)
+        return list(seen)
+
+    # returns a list of all predecessors of the given node. Uses the reverse-edge index (cost is the in-degree
+    # of the node) unless a different graph is passed, in which case all nodes are scanned. A node that is not in the
+    # graph has no predecessors
+    def predecessors(self, node, graph=None):
+        if self._indexed(graph):
+            return list(self.reverse.get(node, ()))
         return [key for key in graph if node in graph[key]]
 
     # returns a list of all nodes this node has edges towards
@@ -45,12 +230,73 @@ class Dag(object):
             raise KeyError('node %s is not in graph' % node)
         return list(graph[node])
 
+    # returns True if there is a path from node x to node y, i.e. y is one of all_downstreams(x). Queries are
+    # answered from a precomputed ReachabilityIndex, which is (re)built on first use after a change to the graph
+    # that it cannot absorb incrementally
+    def is_upstream(self, x, y):
+        if self.reach_index is None:
+            self.reach_index = ReachabilityIndex(self.graph, self.reverse)
+        return x != y and self.reach_index.reaches(x, y)
+
     # returns a list of all nodes ultimately downstream of the given node in the
-    # dependency graph, in topological order
+    # dependency graph, in topological order. Only the reachable subgraph is sorted
     def all_downstreams(self, node, graph=None):
         if graph is None:
             graph = self.graph
-        nodes = [node]
+        nodes_seen = self._reachable([node], graph)
+        return self._subgraph_order(nodes_seen, graph)
+
+    # batched all_downstreams: returns an OrderedDict mapping each of the given nodes to its list of downstream
+    # nodes. The union of the reachable subgraphs is searched and sorted once. If it has at most
+    # ReachabilityIndex.bitset_limit nodes, it is then swept in reverse topological order, each node's downstream
+    # set being the union of its children's (as a bitset over the shared order, as in ReachabilityIndex), so that
+    # work below a node is shared by all the sources above it; a child's bitset is freed once all its parents are
+    # done, and only the sources' are kept. Each result is read off its bitset in ascending bit order, which is
+    # topological order. Larger regions would need O(region^2) bits, so there each source gets its own search,
+    # ordered by the shared sort
+    def all_downstreams_batch(self, nodes, graph=None):
+        if graph is None:
+            graph = self.graph
+        nodes = list(nodes)
+        region = self._reachable(nodes, graph)
+        region.update(nodes)
+        order = self._subgraph_order(region, graph)
+        bit = dict((u, i) for i, u in enumerate(order))
+        result = OrderedDict()
+        if len(order) > ReachabilityIndex.bitset_limit:
+            for node in nodes:
+                result[node] = sorted(self._reachable([node], graph), key=bit.__getitem__)
+            return result
+        parents_left = dict((u, 0) for u in order) # parents of u in the region not yet swept
+        for u in order:
+            for v in graph[u]:
+                parents_left[v] += 1
+        sources = set(nodes)
+        closure, below = {}, {} # downstreams of each source; downstreams of u plus u itself, while still needed
+        for u in reversed(order):
+            mask = 0
+            for v in graph[u]:
+                mask |= below[v]
+                parents_left[v] -= 1
+                if parents_left[v] == 0:
+                    del below[v]
+            if u in sources:
+                closure[u] = mask
+            if parents_left[u]:
+                below[u] = mask | (1 << bit[u])
+        for node in nodes:
+            bits = bin(closure[node])[:1:-1] # bits[i] == '1' if order[i] is downstream of node
+            downstreams = []
+            i = bits.find('1')
+            while i >= 0:
+                downstreams.append(order[i])
+                i = bits.find('1', i + 1)
+            result[node] = downstreams
+        return result
+
+    # returns the set of nodes reachable by one or more edges from any of the start nodes (breadth-first search)
+    def _reachable(self, start, graph):
+        nodes = list(start)
         nodes_seen = set()
         i = 0
         while i < len(nodes):
@@ -60,12 +306,31 @@ class Dag(object):
                     nodes_seen.add(downstream_node)
                     nodes.append(downstream_node)
             i +=1
-        return list(
-            filter(
-                lambda node: node in nodes_seen,
-                self.topological_sort(graph=graph)
-            )
-        )
+        return nodes_seen
+
+    # returns the given subset of nodes in topological order, taken from the online order if it is maintained and
+    # otherwise from a Kahn sort of the induced subgraph only. Raises ValueError if the subgraph is not acyclic
+    def _subgraph_order(self, subset, graph):
+        if self.online_order and graph is self.graph:
+            return sorted(subset, key=self.position.__getitem__)
+        in_degree = dict((u, 0) for u in subset)
+        for u in subset:
+            for v in graph[u]:
+                if v in in_degree:
+                    in_degree[v] += 1
+        queue = deque(u for u in subset if in_degree[u] == 0)
+        l = []
+        while queue:
+            u = queue.popleft()
+            l.append(u)
+            for v in graph[u]:
+                if v in in_degree:
+                    in_degree[v] -= 1
+                    if in_degree[v] == 0:
+                        queue.append(v)
+        if len(l) != len(subset):
+            raise ValueError('graph is not acyclic')
+        return l
 
     # return a list of all leaves (nodes with no downstreams)
     def all_leaves(self, graph=None):
@@ -75,14 +340,17 @@ class Dag(object):
 
     # returns a list of all nodes in the graph with no dependencies
     def ind_nodes(self, graph=None):
-        if graph is None:
-            graph = self.graph
+        if self._indexed(graph):
+            reverse = self.reverse
+            return [node for node in self.graph if not reverse[node]]
         dependent_nodes = set(
             node for dependents in iter(graph.values()) for node in dependents)
         return [node for node in graph.keys() if node not in dependent_nodes]
 
     # Returns Boolean of whether DAG is valid by attempting a topological sort
     def validate(self, graph=None):
+        if self.online_order and self._indexed(graph):
+            return len(self.graph) > 0 # acyclic by construction
         graph = graph if graph is not None else self.graph
         if len(self.ind_nodes(graph)) == 0:
             return False # no indep. nodes detected
@@ -95,16 +363,19 @@ class Dag(object):
     # Returns a topological ordering of the DAG. Raises ValueError if this is not possible
     # (in which case, graph is not a valid DAG)
     def topological_sort(self, graph=None):
-        if graph is None:
+        if self.online_order and self._indexed(graph):
+            return list(self.order)
+        in_degree = OrderedDict()
+        if self._indexed(graph):
             graph = self.graph
-
-        in_degree = {}
-        for u in graph:
-            in_degree[u] = 0
-
-        for u in graph:
-            for v in graph[u]:
-                in_degree[v] += 1
+            for u in graph:
+                in_degree[u] = len(self.reverse[u])
+        else:
+            for u in graph:
+                in_degree[u] = 0
+            for u in graph:
+                for v in graph[u]:
+                    in_degree[v] += 1
 
         queue = deque()
         for u in in_degree:
@@ -124,3 +395,413 @@ class Dag(object):
             return l
         else:
             raise ValueError('graph is not acyclic')
+
+
+# Binary graph image written by FrozenDag.save: a fixed header, the node-id table, then the four CSR arrays
+# (offsets, targets, in_offsets, sources) as little-endian integers of the given item size, each section starting
+# on an 8-byte boundary. The node-id table is empty if the node names are the ids 0...n-1, an int64 array if they
+# are other integers, and for text (or byte string) names an int64 array of n+1 offsets followed by the names,
+# UTF-8 encoded (or raw) and concatenated. Any other names are stored as a pickled list, which FrozenDag.load only
+# reads when asked to (unpickling data from an untrusted file can run arbitrary code)
+_MAGIC = b'HETLDAG1'
+_HEADER = struct.Struct('<8sIIQQQ') # magic, node table kind, item size, n nodes, n edges, node table bytes
+_IDENTITY_NODES, _INT_NODES, _PICKLED_NODES, _TEXT_NODES, _BYTES_NODES = 0, 1, 2, 3, 4
+_text_type = type(u'')
+
+# Node names of a loaded graph image with a text (or byte string) node table: a read-only sequence that decodes a
+# name from the image only when it is accessed
+class _StringTable(object):
+
+    def __init__(self, buf, n, pos, text):
+        self.offsets = np.frombuffer(buf, dtype='<i8', count=n+1, offset=pos)
+        self.buf = buf
+        self.start = pos + 8*(n+1)
+        self.text = text
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if not -len(self) <= i < len(self):
+            raise IndexError('node id out of range')
+        i %= len(self)
+        name = self.buf[self.start + int(self.offsets[i]):self.start + int(self.offsets[i+1])]
+        return name.decode('utf-8') if self.text else bytes(name)
+
+    def __iter__(self):
+        for i in xrange(len(self)):
+            yield self[i]
+
+def _require_numpy():
+    if np is None:
+        raise ImportError('FrozenDag.save and FrozenDag.load require numpy')
+
+def _align(k):
+    return (k + 7) // 8 * 8
+
+# smallest array typecode able to hold the integers 0...maxval
+def _typecode(maxval):
+    return 'i' if maxval < 2**31 else 'l'
+
+# Immutable DAG stored in compressed sparse row (CSR) form. Node names are mapped to ids 0...n-1 (in the order of
+# the source graph) and the out-edges of node i are targets[offsets[i]:offsets[i+1]]. The in-edges are held in the
+# same way (in_offsets, sources) so that predecessor queries do not have to scan the graph.
+class FrozenDag(object):
+
+    # if nodes is None, the node names are the integer ids themselves and no name table is held
+    def __init__(self, nodes, offsets, targets, in_offsets, sources):
+        self.identity = nodes is None
+        self.nodes = xrange(len(offsets) - 1) if nodes is None else nodes # node names, indexed by node id
+        self._index = None
+        self.offsets = offsets
+        self.targets = targets
+        self.in_offsets = in_offsets
+        self.sources = sources
+
+    # builds the CSR arrays from a dict of sets (e.g. Dag.graph). Targets of each node are kept in the iteration
+    # order of its set, so that downstream() and topological_sort() give the same results as the Dag
+    @classmethod
+    def from_graph(cls, graph):
+        nodes = list(graph)
+        index = dict((node, i) for i, node in enumerate(nodes))
+        n = len(nodes)
+        n_edges = sum(len(graph[node]) for node in nodes)
+        offsets = array(_typecode(n_edges), [0]*(n+1))
+        targets = array(_typecode(n), [0]*n_edges)
+        in_degree = [0]*n
+        k = 0
+        for i, node in enumerate(nodes):
+            for dep_node in graph[node]:
+                j = index[dep_node]
+                targets[k] = j
+                in_degree[j] += 1
+                k += 1
+            offsets[i+1] = k
+        # counting sort of the edges by target gives the reverse CSR, with sources in ascending id order
+        in_offsets = array(offsets.typecode, [0]*(n+1))
+        for j in range(n):
+            in_offsets[j+1] = in_offsets[j] + in_degree[j]
+        sources = array(targets.typecode, [0]*n_edges)
+        fill = list(in_offsets[:n])
+        for i in range(n):
+            for k in range(offsets[i], offsets[i+1]):
+                j = targets[k]
+                sources[fill[j]] = i
+                fill[j] += 1
+        return cls(nodes, offsets, targets, in_offsets, sources)
+
+    # builds the CSR arrays directly from NumPy arrays of integer node ids in 0...n-1 (n defaults to the largest id
+    # plus one). Duplicate edges are dropped; out-edges are stored in ascending order of target. The bounds check and
+    # construction are vectorised, so no per-edge Python objects are created
+    @classmethod
+    def from_arrays(cls, ind_nodes, dep_nodes, n=None):
+        ind_nodes, dep_nodes = np.asarray(ind_nodes, dtype=np.int64), np.asarray(dep_nodes, dtype=np.int64)
+        if ind_nodes.shape != dep_nodes.shape or ind_nodes.ndim != 1:
+            raise ValueError('edge arrays must be one-dimensional and of equal length')
+        if n is None:
+            n = int(max(ind_nodes.max(), dep_nodes.max())) + 1 if len(ind_nodes) else 0
+        if len(ind_nodes) and (min(ind_nodes.min(), dep_nodes.min()) < 0
+                               or max(ind_nodes.max(), dep_nodes.max()) >= n):
+            raise KeyError("Attempting to add edge involving one or more nonexistent nodes")
+        key = np.sort(ind_nodes*n + dep_nodes) # sorted by source, then target
+        if len(key):
+            key = key[np.concatenate(([True], key[1:] != key[:-1]))] # drop duplicate edges
+        ind_nodes, dep_nodes = key // n, key % n
+        dtype = np.int32 if max(n, len(key)) < 2**31 else np.int64
+        offsets = np.zeros(n+1, dtype=dtype)
+        np.cumsum(np.bincount(ind_nodes, minlength=n), out=offsets[1:])
+        in_offsets = np.zeros(n+1, dtype=dtype)
+        np.cumsum(np.bincount(dep_nodes, minlength=n), out=in_offsets[1:])
+        perm = np.argsort(dep_nodes, kind='mergesort') # stable, so sources stay in ascending order
+        return cls(None, offsets, dep_nodes.astype(dtype), in_offsets, ind_nodes[perm].astype(dtype))
+
+    # returns a (mutable) Dag with the same nodes and edges
+    def thaw(self):
+        dag = Dag()
+        for node in self.nodes:
+            dag.add_node(node)
+        for i, node in enumerate(self.nodes):
+            for k in range(self.offsets[i], self.offsets[i+1]):
+                dag.add_edge(node, self.nodes[self.targets[k]])
+        return dag
+
+    # returns the graph as an OrderedDict of sets, the representation used by Dag and throughout hetland/
+    def to_graph(self):
+        nodes, offsets, targets = self.nodes, self.offsets, self.targets
+        return OrderedDict((node, set(nodes[targets[k]] for k in range(offsets[i], offsets[i+1])))
+                           for i, node in enumerate(nodes))
+
+    # writes the binary graph image (see _HEADER) to a path or open binary file. Requires numpy
+    def save(self, f):
+        _require_numpy()
+        if isinstance(f, str):
+            with open(f, 'wb') as fh:
+                return self.save(fh)
+        n, m = len(self.nodes), len(self.targets)
+        itemsize = 4 if max(n, m) < 2**31 else 8
+        if self.identity or all(type(node) is int and node == i for i, node in enumerate(self.nodes)):
+            kind, table = _IDENTITY_NODES, b''
+        elif all(isinstance(node, (int, np.integer)) for node in self.nodes):
+            kind, table = _INT_NODES, np.asarray(self.nodes, dtype='<i8').tobytes()
+        elif all(isinstance(node, _text_type) for node in self.nodes) or all(isinstance(node, bytes) for node in self.nodes):
+            text = isinstance(self.nodes[0], _text_type)
+            kind = _TEXT_NODES if text else _BYTES_NODES
+            names = [node.encode('utf-8') for node in self.nodes] if text else list(self.nodes)
+            offsets = np.zeros(n+1, dtype='<i8')
+            np.cumsum([len(name) for name in names], out=offsets[1:])
+            table = offsets.tobytes() + b''.join(names)
+        else:
+            kind, table = _PICKLED_NODES, pickle.dumps(list(self.nodes), 2)
+        f.write(_HEADER.pack(_MAGIC, kind, itemsize, n, m, len(table)))
+        f.write(table)
+        f.write(b'\0'*(_align(len(table)) - len(table)))
+        for values in (self.offsets, self.targets, self.in_offsets, self.sources):
+            data = np.asarray(values, dtype='<i%d' % itemsize).tobytes()
+            f.write(data)
+            f.write(b'\0'*(_align(len(data)) - len(data)))
+
+    # opens a graph image written by save, from a path or an open binary file. With use_mmap=True (the default) the
+    # file is memory-mapped read-only and the CSR arrays and the node table are views onto the mapping: nothing is
+    # deserialised up front (string names are decoded one at a time as they are used), and processes that load the
+    # same file share one copy of it through the page cache. A file object that cannot be mapped (e.g. BytesIO), or
+    # is not positioned at its start, is read into memory instead. A pickled node table (names other than integers
+    # and strings) is refused unless allow_pickle=True, since unpickling an untrusted file can run arbitrary code.
+    # Requires numpy
+    @classmethod
+    def load(cls, f, use_mmap=True, allow_pickle=False):
+        _require_numpy()
+        if isinstance(f, str):
+            with open(f, 'rb') as fh:
+                return cls.load(fh, use_mmap, allow_pickle)
+        buf = None
+        if use_mmap:
+            try:
+                if f.tell() == 0:
+                    buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (AttributeError, IOError, OSError, ValueError): # no file descriptor, or an empty file
+                pass
+        if buf is None:
+            buf = f.read()
+        magic, kind, itemsize, n, m, table_len = _HEADER.unpack_from(buf, 0)
+        if magic != _MAGIC:
+            raise ValueError('%s is not a graph image' % getattr(f, 'name', f))
+        pos = _HEADER.size
+        if kind == _IDENTITY_NODES:
+            nodes = None
+        elif kind == _INT_NODES:
+            nodes = np.frombuffer(buf, dtype='<i8', count=n, offset=pos)
+        elif kind in (_TEXT_NODES, _BYTES_NODES):
+            nodes = _StringTable(buf, n, pos, kind == _TEXT_NODES)
+        elif allow_pickle:
+            nodes = pickle.loads(buf[pos:pos+table_len])
+        else:
+            raise ValueError('graph image has a pickled node table; load it with allow_pickle=True only if the file is trusted')
+        pos += _align(table_len)
+        arrays = []
+        for count in (n+1, m, n+1, m):
+            arrays.append(np.frombuffer(buf, dtype='<i%d' % itemsize, count=count, offset=pos))
+            pos += _align(count*itemsize)
+        frozen = cls(nodes, *arrays)
+        frozen.buffer = buf # keeps the mapping open for as long as the arrays are in use
+        return frozen
+
+    def __len__(self):
+        return len(self.nodes)
+
+    # node name -> node id, built on first use (None if the names are the ids)
+    @property
+    def index(self):
+        if self._index is None and not self.identity:
+            self._index = dict((node, i) for i, node in enumerate(self.nodes))
+        return self._index
+
+    def __contains__(self, node):
+        if self.identity:
+            try:
+                return 0 <= node < len(self.nodes) and node == int(node)
+            except (TypeError, ValueError):
+                return False
+        return node in self.index
+
+    def n_edges(self):
+        return len(self.targets)
+
+    def _id(self, node):
+        if self.identity:
+            if node not in self:
+                raise KeyError('node %s is not in graph' % node)
+            return int(node)
+        try:
+            return self.index[node]
+        except KeyError:
+            raise KeyError('node %s is not in graph' % node)
+
+    # returns a list of all predecessors of the given node
+    def predecessors(self, node):
+        i = self._id(node)
+        nodes, sources = self.nodes, self.sources
+        return [nodes[sources[k]] for k in range(self.in_offsets[i], self.in_offsets[i+1])]
+
+    # returns a list of all nodes this node has edges towards
+    def downstream(self, node):
+        i = self._id(node)
+        nodes, targets = self.nodes, self.targets
+        return [nodes[targets[k]] for k in range(self.offsets[i], self.offsets[i+1])]
+
+    # return a list of all leaves (nodes with no downstreams)
+    def all_leaves(self):
+        offsets = self.offsets
+        return [node for i, node in enumerate(self.nodes) if offsets[i] == offsets[i+1]]
+
+    # returns a list of all nodes in the graph with no dependencies
+    def ind_nodes(self):
+        in_offsets = self.in_offsets
+        return [node for i, node in enumerate(self.nodes) if in_offsets[i] == in_offsets[i+1]]
+
+    # Returns a topological ordering of the DAG (Kahn algorithm, with the same queue discipline as
+    # Dag.topological_sort). Raises ValueError if the graph is not acyclic
+    def topological_sort(self):
+        n = len(self.nodes)
+        offsets, targets, in_offsets = self.offsets, self.targets, self.in_offsets
+        in_degree = [in_offsets[i+1] - in_offsets[i] for i in range(n)]
+        queue = deque(i for i in range(n) if in_degree[i] == 0)
+        l = []
+        while queue:
+            u = queue.popleft()
+            l.append(u)
+            for k in range(offsets[u], offsets[u+1]):
+                v = targets[k]
+                in_degree[v] -= 1
+                if in_degree[v] == 0:
+                    queue.append(v)
+        if len(l) == n:
+            nodes = self.nodes
+            return [nodes[u] for u in l]
+        else:
+            raise ValueError('graph is not acyclic')
+
+
+# Precomputed reachability for a graph given as a dict of sets (plus its reverse-edge index). reaches(u, v) is True
+# if v can be reached from u (including u == v). Two representations are available:
+#   'bitset': every node holds its closure as a Python int bitmask, filled in reverse topological order.
+#             Queries are a single bit test, and new nodes and edges are absorbed incrementally, but memory is O(n^2)
+#             bits, so this is used for small graphs only: once the graph grows past bitset_limit nodes, add_node
+#             declines the update, and the index is dropped (and rebuilt as '2hop').
+#   '2hop':   pruned landmark labelling. Nodes are processed in decreasing order of degree, and each runs a pruned
+#             forward and backward search that adds it as a hub to the in/out labels of the nodes it reaches.
+#             u reaches v iff out_label[u] and in_label[v] share a hub. Labels are usually small, so queries are
+#             close to O(1); any change to the graph requires a rebuild.
+# Both representations require the graph to be acyclic: building either raises ValueError otherwise, and an edge that
+# closes a cycle is not absorbed incrementally, so the next query after it rebuilds the index and raises.
+class ReachabilityIndex(object):
+
+    bitset_limit = 4096 # largest graph for which the bitset closure is used by default
+
+    def __init__(self, graph, reverse, method=None):
+        if method is None:
+            method = 'bitset' if len(graph) <= self.bitset_limit else '2hop'
+        self.method = method
+        self.graph = graph
+        if method == 'bitset':
+            self._build_bitset(graph, reverse)
+        elif method == '2hop':
+            self._build_2hop(graph, reverse)
+        else:
+            raise ValueError('unknown reachability index method %s' % method)
+
+    def _build_bitset(self, graph, reverse):
+        self.bit = dict((node, i) for i, node in enumerate(graph))
+        self.closure = {}
+        # Kahn sort on the reversed graph: a node is processed once all of its downstreams are done
+        out_degree = dict((u, len(graph[u])) for u in graph)
+        queue = deque(u for u in graph if out_degree[u] == 0)
+        while queue:
+            u = queue.popleft()
+            mask = 1 << self.bit[u]
+            for v in graph[u]:
+                mask |= self.closure[v]
+            self.closure[u] = mask
+            for w in reverse[u]:
+                out_degree[w] -= 1
+                if out_degree[w] == 0:
+                    queue.append(w)
+        if len(self.closure) != len(graph):
+            raise ValueError('graph is not acyclic')
+
+    def _build_2hop(self, graph, reverse):
+        # the labels themselves would silently cover cycles, so check acyclicity first (Kahn count)
+        in_degree = dict((u, len(reverse[u])) for u in graph)
+        queue = [u for u in graph if in_degree[u] == 0]
+        n_done = 0
+        while queue:
+            u = queue.pop()
+            n_done += 1
+            for v in graph[u]:
+                in_degree[v] -= 1
+                if in_degree[v] == 0:
+                    queue.append(v)
+        if n_done != len(graph):
+            raise ValueError('graph is not acyclic')
+        # decreasing degree; ties are broken in a (seeded) random order, since taking them in graph order makes the
+        # labels of a long path grow linearly (every node a hub for all nodes after it), where random order keeps
+        # them O(log n) in expectation
+        hubs = list(graph)
+        random.Random(0).shuffle(hubs)
+        hubs.sort(key=lambda u: (len(graph[u]) + 1)*(len(reverse[u]) + 1), reverse=True)
+        self.out_label = dict((u, set()) for u in graph)
+        self.in_label = dict((u, set()) for u in graph)
+        for k, hub in enumerate(hubs):
+            self._pruned_search(k, hub, graph, self.out_label[hub], self.in_label, self.out_label, False)
+            self._pruned_search(k, hub, reverse, self.in_label[hub], self.out_label, self.in_label, True)
+
+    # breadth-first search from hub k, adding k to labels[w] for every w whose reachability from (or to) the hub
+    # is not already covered by earlier hubs
+    def _pruned_search(self, k, hub, adjacency, hub_label, labels, other_labels, backward):
+        seen = set([hub])
+        queue = deque([hub])
+        while queue:
+            w = queue.popleft()
+            if backward:
+                covered = not labels[w].isdisjoint(other_labels[hub])
+            else:
+                covered = not hub_label.isdisjoint(labels[w])
+            if covered:
+                continue
+            labels[w].add(k)
+            for x in adjacency[w]:
+                if x not in seen:
+                    seen.add(x)
+                    queue.append(x)
+
+    def reaches(self, u, v):
+        if self.method == 'bitset':
+            return (self.closure[u] >> self.bit[v]) & 1 == 1
+        return not self.out_label[u].isdisjoint(self.in_label[v])
+
+    # incremental updates: return False if the index cannot absorb the change and has to be rebuilt
+    def add_node(self, node):
+        if self.method != 'bitset' or len(self.bit) >= self.bitset_limit:
+            return False
+        self.bit[node] = len(self.bit)
+        self.closure[node] = 1 << self.bit[node]
+        return True
+
+    def add_edge(self, ind_node, dep_node, reverse):
+        if self.method != 'bitset' or self.reaches(dep_node, ind_node): # the edge would close a cycle
+            return False
+        if self.reaches(ind_node, dep_node):
+            return True
+        # every node that reaches ind_node but not yet dep_node gains the closure of dep_node. Nodes that already
+        # reach dep_node (and hence their own ancestors) are left alone
+        closure, bit = self.closure, self.bit[dep_node]
+        mask = closure[dep_node]
+        stack = [ind_node]
+        seen = set(stack)
+        while stack:
+            u = stack.pop()
+            closure[u] |= mask
+            for w in reverse[u]:
+                if w not in seen and not (closure[w] >> bit) & 1:
+                    seen.add(w)
+                    stack.append(w)
+        return True
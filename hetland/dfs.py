@@ -1,26 +1,114 @@
+'''
+Python script for depth-first search (DFS) of a directed graph given as a dict of sets (as used throughout hetland/, e.g. Dag.graph).
+Each node receives a discovery time when it is first reached and a finish time once everything reachable from it has been explored, from a single
+clock. These timestamps nest like parentheses: u is an ancestor of v in the DFS forest exactly when d[u] <= d[v] and f[v] <= f[u], so ancestor
+queries cost O(1) once the search has been run. Each edge (u, v) is classified when it is examined:
+    tree    - v is discovered through this edge
+    back    - v is an ancestor of u still being explored (the graph has a cycle)
+    forward - v is an already finished descendant of u
+    cross   - anything else (v is finished, in another subtree or an earlier tree)
+The search keeps an explicit stack of (node, iterator over its out-edges) pairs, so it is not limited by Python's recursion depth.
+'''
+
 import random
 from dag import Dag
 
-#Create a random graph
-n_nodes = 10
-n_edges = 20
-randseed = 18
-graph_is_dag = True
-
-dag1 = Dag()
-random.seed(randseed)
-
-for i in range(n_nodes):
-    dag1.add_node(i)
-for i in range(n_edges):
-    node1 = random.randint(0,n_nodes-1)
-    node2 = random.randint(0,n_nodes-1)
-    dag1.add_edge(node1, node2)
-if graph_is_dag:
-    while not dag1.validate():
+TREE, BACK, FORWARD, CROSS = 'tree', 'back', 'forward', 'cross'
+
+class DepthFirstSearch(object):
+
+    # runs the search from each of sources in turn (all nodes of G, in order, by default). If classify is False, edge types are not stored
+    def __init__(self, G, sources=None, classify=True):
+        self.G = G
+        self.discovery = {} # node -> discovery time
+        self.finish = {} # node -> finish time
+        self.parent = {} # node -> parent in the DFS forest (None for roots)
+        self.edge_type = {} if classify else None # (u, v) -> TREE/BACK/FORWARD/CROSS
+        self.n_back_edges = 0
+        self.time = 0
+        for s in (G if sources is None else sources):
+            if s not in self.discovery:
+                self._visit(s)
+
+    def _visit(self, s):
+        G, d, f, parent, edge_type = self.G, self.discovery, self.finish, self.parent, self.edge_type
+        d[s] = self.time
+        self.time += 1
+        parent[s] = None
+        stack = [(s, iter(G[s]))]
+        while stack:
+            u, it = stack[-1]
+            for v in it:
+                if v not in d:
+                    kind = TREE
+                    d[v] = self.time
+                    self.time += 1
+                    parent[v] = u
+                    stack.append((v, iter(G[v])))
+                elif v not in f:
+                    kind = BACK
+                    self.n_back_edges += 1
+                elif d[u] < d[v]:
+                    kind = FORWARD
+                else:
+                    kind = CROSS
+                if edge_type is not None:
+                    edge_type[u, v] = kind
+                if kind == TREE: break # descend into v, continue with u's remaining edges later
+            else: # all out-edges of u explored
+                stack.pop()
+                f[u] = self.time
+                self.time += 1
+
+    # True if u is an ancestor of v in the DFS forest (or u == v). O(1)
+    def is_ancestor(self, u, v):
+        return self.discovery[u] <= self.discovery[v] and self.finish[v] <= self.finish[u]
+
+    # True if the graph (restricted to the nodes searched) contains a cycle
+    def has_cycle(self):
+        return self.n_back_edges > 0
+
+    # nodes in decreasing order of finish time: a topological order if there is no cycle
+    def topological_order(self):
+        return sorted(self.finish, key=self.finish.get, reverse=True)
+
+    # parent pointers as an array, for graphs on the integer nodes 0...n-1 (-1 for roots and for nodes not reached)
+    def parent_array(self, n):
+        parent = [-1]*n
+        for v, u in self.parent.items():
+            if u is not None: parent[v] = u
+        return parent
+
+
+if __name__ == '__main__':
+    #Create a random graph
+    n_nodes = 10
+    n_edges = 20
+    randseed = 18
+    graph_is_dag = True
+
+    # in online-order mode, add_edge rejects (with ValueError) any edge that would create a cycle, so the graph
+    # stays acyclic after every insertion and validate() no longer needs a full topological sort
+    dag1 = Dag(online_order=graph_is_dag)
+    random.seed(randseed)
+
+    for i in range(n_nodes):
+        dag1.add_node(i)
+    for i in range(n_edges):
         node1 = random.randint(0,n_nodes-1)
         node2 = random.randint(0,n_nodes-1)
-        dag1.add_edge(node1, node2)
-        # remove an edge between two nodes that are known to be connected
-        print dag1.graph
-print dag1.graph
+        try:
+            dag1.add_edge(node1, node2)
+        except ValueError:
+            continue # edge would close a cycle
+    print(dag1.graph)
+    print(dag1.validate())
+    print(dag1.topological_sort())
+
+    search = DepthFirstSearch(dag1.graph)
+    print(search.discovery)
+    print(search.finish)
+    print(search.parent_array(n_nodes))
+    print(sorted(search.edge_type.items()))
+    print(search.has_cycle())
+    print(search.topological_order())
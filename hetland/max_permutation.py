@@ -11,6 +11,13 @@ of maximum subset size (members of this subset can permute freely, and thus each
 permute and therefore must map onto themselves (they cannot be permuted consistently with the max permutation group).
 '''
 
+import random
+from heapq import heappush, heappop
+from itertools import permutations
+from timeit import default_timer
+import numpy as np
+from scc import strongly_connected_components
+
 M = [2, 2, 0, 5, 3, 5, 7, 4] #mapping preferences
 
 #Naive recursive algorithm for finding a max permutation
@@ -56,45 +63,184 @@ def max_perm(M):
 A = max_perm(M)
 print A
 
+'''For very large mappings the per-element cost of the set and the Python list of counts dominates. The same reference counting can be done on arrays:
+np.bincount gives the in-degrees in one pass, A becomes a Boolean membership mask, and the queue is a preallocated int array (each member enters it
+at most once), processed a whole batch at a time. Members in a batch all have count zero, so none of them points at another; decrementing the
+counts of their targets (after sorting the targets to count repeats) gives the next batch: the targets whose count has just reached zero.'''
+
+def max_perm_np(M):
+    M = np.asarray(M, dtype=np.intp)
+    n = len(M)
+    count = np.bincount(M, minlength=n) # no. of times that each member is pointed to
+    A = np.ones(n, dtype=bool) # membership mask
+    Q = np.empty(n, dtype=np.intp) # queue of members not pointed to
+    start = np.flatnonzero(count == 0)
+    head, tail = 0, len(start)
+    Q[:tail] = start
+    while head < tail:
+        batch = Q[head:tail]
+        head = tail
+        A[batch] = False
+        targets = np.sort(M[batch])
+        edges = np.flatnonzero(targets[1:] != targets[:-1]) + 1
+        j = targets[np.concatenate(([0], edges))] # distinct targets
+        count[j] -= np.diff(np.concatenate(([0], edges, [len(targets)]))) # and how often each was pointed to by the batch
+        j = j[count[j] == 0] # no longer pointed to
+        Q[tail:tail+len(j)] = j
+        tail += len(j)
+    return A
+
+if __name__ == '__main__':
+    A = max_perm_np(M)
+    print A, np.flatnonzero(A)
+    #Timing of the set-based and array-based versions on a random mapping
+    R = np.random.randint(0, 10**6, size=10**6)
+    Rl = R.tolist()
+    t = default_timer()
+    A = max_perm(Rl)
+    t_set = default_timer() - t
+    t = default_timer()
+    A_np = max_perm_np(R)
+    t_np = default_timer() - t
+    print "n = 10^6: max_perm %.3f s, max_perm_np %.3f s, same result: %s" % (t_set, t_np, A == set(np.flatnonzero(A_np).tolist()))
+
 '''
 Now let us consider the case where preference weights are not equal. In this case, we do not necessarily want the permutation group with the largest number of members. Instead,
-we want to ensure that we satisfy the members of the set that have the strongest preferences. For members of the set that are pointed to more than once, we choose that which has a
-higher preference (greedy strategy) and try and build a permutable subgroup starting from it, by following connections until the original chosen node is found (this cycle is for
-a one-to-one mapping subgroup. There may be other, independent subgroups. If the attempt is unsuccessful, we choose the pointing member with
-next highest preference weight, and so on. After all attempts on nodes to which multiple members point have been attempted, we have (hopefully) found a one-to-one mapping
-with maximum preference weights.
+we want to ensure that we satisfy the members of the set that have the strongest preferences. A greedy strategy (for a member that is pointed to more than once, keep the
+pointer with the highest weight) is not enough: satisfying one strong preference may break the only cycle through which several weaker preferences, with a larger total, could
+be satisfied. The problem is an assignment problem: each member i is assigned to one member P[i], P must be a permutation, P[i] is either one of the members that i prefers or i
+itself (weight 0), and the total weight of satisfied preferences is to be maximised. Members can only be permuted around cycles, so an edge between two different strongly
+connected components (SCCs) of the preference graph can never be used, and each SCC is solved independently (members in an SCC of their own map onto themselves).
+Each SCC is solved as a min-cost perfect matching (cost = -weight) by successive shortest paths: the rows (pointing members) are matched one at a time, each along the cheapest
+augmenting path, found by Dijkstra's algorithm on the reduced costs c[i][j] - u[i] - v[j] >= 0 (Hungarian method with dual potentials u, v). The preference graph is sparse,
+so each search touches only the arcs it reaches, rather than the n^2 entries of a dense cost matrix.
 '''
 
 Mw = {0: (2, 7), 1: (2, 3), 2: (0, 1), 3: (5, 10), 4: (3, 2), 5: (5, 1), 6: (7, 3), 7: (4, 12)}
-# preference mapping with weights. Format is... member: (preferred member, preference weight)
+# preference mapping with weights. Format is... member: (preferred member, preference weight), or member: [(preferred member, preference weight), ...]
+# for a member with several preferences
 print "weighted map", Mw
 
-# Algorithm for finding a permutation with max preference weights
+# Min-cost perfect matching of rows 0...k-1 onto columns 0...k-1. cost[i] is a dict column -> cost of the allowed arcs of row i; a perfect matching
+# must exist. Column potentials v start at the column minima (each row that is the minimum of a still free column is matched to it straight away);
+# the potential of a matched row is implicit, u[i] = cost[i][col_of[i]] - v[col_of[i]]. Returns col_of, the column matched to each row
+def _min_cost_assignment(cost):
+    k = len(cost)
+    inf = float('inf')
+    v = [inf]*k
+    best_row = [-1]*k
+    for i in range(k):
+        for j, c in cost[i].items():
+            if c < v[j]: v[j], best_row[j] = c, i
+    col_of, row_of = [-1]*k, [-1]*k
+    for j in range(k):
+        i = best_row[j]
+        if col_of[i] < 0:
+            col_of[i], row_of[j] = j, i
+    for r in range(k):
+        if col_of[r] >= 0: continue
+        # Dijkstra from the free row r over columns; a settled matched column j continues the search from its row
+        u_r = min(c - v[j] for j, c in cost[r].items())
+        dist, pred, done, heap = {}, {}, {}, []
+        for j, c in cost[r].items():
+            dist[j], pred[j] = c - v[j] - u_r, r
+            heappush(heap, (dist[j], j))
+        while True:
+            d, j = heappop(heap)
+            if j in done or d > dist[j]: continue
+            done[j] = d
+            i = row_of[j]
+            if i < 0: break # free column reached at distance d
+            u_i = cost[i][j] - v[j]
+            for jj, c in cost[i].items():
+                if jj in done: continue
+                nd = d + c - v[jj] - u_i
+                if nd < dist.get(jj, inf):
+                    dist[jj], pred[jj] = nd, i
+                    heappush(heap, (nd, jj))
+        for jj, dj in done.items(): # keeps every reduced cost >= 0 and makes the path arcs tight
+            v[jj] += dj - d
+        while True: # augment along the path, back to r
+            i = pred[j]
+            prev = col_of[i]
+            col_of[i], row_of[j] = j, i
+            if i == r: break
+            j = prev
+    return col_of
 
+# Returns the permutation as a list, P[i] = member that i is mapped to. Members are 0...n-1. Where a member lists the same preferred member
+# more than once, the largest weight counts. Negative weights are allowed (such a preference is only ever used if it makes a cycle possible
+# whose total weight is larger)
 def weighted_max_perm(Mw):
-    A = set(range(len(M))) # initialise A = {0,1,...,n-1}
-    count = [0]*len(M) # no. of times each member is pointed to
-    pointers = {i: [[], []] for i in range(len(M))} # list of pointers (and list of associated weights) to a given member
-    for key, item in Mw.items():
-        count[Mw[key][0]] += 1
-        pointers[Mw[key][0]][0].append(key)
-        pointers[Mw[key][0]][1].append(Mw[key][1])
-#        pointers[Mw[key][0]].append(item)
-    Q = [i for i in A if count[i] > 1] # members pointed to more than once
-    print "pointers", pointers
-    B = set()
-    # find member pointing to disputed member that has lowest preference weight and delete
-    while Q:
-        print "Q", Q
-        i = Q.pop()
-        maxweight = max(pointers[i][1])
-        j = pointers[i][1].index(maxweight)
-        k = pointers[i][0][j]
-        print "found node k with largest weight", k
-        print "Trying to build max perm group including k"
-        B.add(k)
-        #CODE TO VERIFY IF A PERM GROUP CAN BE DERIVED STARTING FROM NODE k#
-    return A
+    n = len(Mw)
+    weight = [dict() for i in range(n)] # weight[i][j] = weight of i's preference for j
+    for i, prefs in Mw.items():
+        if isinstance(prefs, tuple): prefs = [prefs]
+        for j, w in prefs:
+            weight[i][j] = max(w, weight[i].get(j, w))
+    G = dict((i, set(weight[i])) for i in range(n))
+    P = list(range(n))
+    for comp in strongly_connected_components(G):
+        if len(comp) == 1: continue
+        local = dict((u, a) for a, u in enumerate(comp))
+        cost = []
+        for u in comp:
+            c = dict((local[j], -w) for j, w in weight[u].items() if j in local)
+            c.setdefault(local[u], 0) # mapping onto itself is always allowed
+            cost.append(c)
+        col_of = _min_cost_assignment(cost)
+        for a, u in enumerate(comp):
+            P[u] = comp[col_of[a]]
+    return P
 
-A = weighted_max_perm(Mw)
-print A
+# total weight of the preferences satisfied by the permutation P
+def perm_weight(Mw, P):
+    total = 0
+    for i, prefs in Mw.items():
+        if isinstance(prefs, tuple): prefs = [prefs]
+        ws = [w for j, w in prefs if j == P[i]]
+        if ws: total += max(ws)
+    return total
+
+# Brute force over all n! permutations, for checking on small inputs. Returns the best total weight
+def brute_max_perm(Mw):
+    n = len(Mw)
+    allowed = []
+    for i in range(n):
+        prefs = [Mw[i]] if isinstance(Mw[i], tuple) else Mw[i]
+        allowed.append(set([i]) | set(j for j, w in prefs))
+    best = None
+    for P in permutations(range(n)):
+        if all(P[i] in allowed[i] for i in range(n)):
+            w = perm_weight(Mw, P)
+            if best is None or w > best: best = w
+    return best
+
+def random_weighted_map(n, k=3, wmax=100):
+    return dict((i, [(random.randrange(n), random.randint(1, wmax)) for j in range(k)]) for i in range(n))
+
+if __name__ == '__main__':
+    A = weighted_max_perm(Mw)
+    print A, "weight", perm_weight(Mw, A), "brute force", brute_max_perm(Mw)
+
+    random.seed(1)
+    n_trials = 100
+    t_brute = t_assign = 0.0
+    same = True
+    for trial in range(n_trials):
+        Mr = random_weighted_map(7, k=2, wmax=10)
+        t0 = default_timer()
+        best = brute_max_perm(Mr)
+        t1 = default_timer()
+        P = weighted_max_perm(Mr)
+        t2 = default_timer()
+        t_brute += t1 - t0
+        t_assign += t2 - t1
+        same = same and perm_weight(Mr, P) == best and sorted(P) == list(range(7))
+    print "n = 7, %i trials: brute force %.3f s, weighted_max_perm %.3f s, same weight: %s" % (n_trials, t_brute, t_assign, same)
+
+    for n in (10**3, 10**4):
+        Mr = random_weighted_map(n)
+        t0 = default_timer()
+        P = weighted_max_perm(Mr)
+        print "n = %i: weighted_max_perm %.3f s, weight %i" % (n, default_timer() - t0, perm_weight(Mr, P))
@@ -2,6 +2,8 @@
 Python script for naive topological sorting using adjacency list representation
 '''
 
+from topsort import iter_topsort
+
 def naive_topsort(G, S=None):
     if S is None: S = set(G)
     if len(S) == 1: return list(S)
@@ -24,3 +26,7 @@ x = l.pop(0)
 
 seq = naive_topsort(G)
 print seq
+
+#naive_topsort recurses once per node and is quadratic; iter_topsort takes the same G and runs iteratively in linear time
+seq = iter_topsort(G)
+print seq
@@ -1,33 +1,128 @@
 '''
 Python script to create a randomised directed acyclic graph (DAG) that is guaranteed to be topologically sorted
+Nodes are the integers 0...n-1 and every edge (i, j) has i < j, so the node numbering is itself a topological order. All edges are drawn in one
+vectorised pass: the candidate pairs of a model are numbered 0...N-1, and the gaps between successive chosen pairs are geometric, so the positions
+of the chosen pairs are a cumulative sum of one array of geometric draws (each pair is then chosen independently with probability p, without
+looping over the N ~ n^2/2 candidates). Node 0 is made the only independent node by giving every other node without a predecessor one edge from
+a random earlier node, which is O(n).
 '''
 
-from dag import Dag
+from dag import Dag, FrozenDag
 from random import randrange
+from timeit import default_timer
 import numpy as np
 
 
-#Construct a random DAG
-n = 10 # no. of nodes
-p = 0.2 # probability of adding an edge
-m = 50 # max. no. of edge-adding attempts
-dag1 = Dag()
-for i in range(n):
-    dag1.add_node(i)
-for i in range(m):
-    addedge = np.random.choice(a=[True, False], p=[p,1-p])
-    if addedge:
-        j = randrange(0,n-2)
-        k = j
-        while k <= j: 
-            k = randrange(0,n-1)
-        dag1.add_edge(j,k)
+# positions in 0...N-1 of the pairs chosen, each independently with probability p, in ascending order
+def _bernoulli_positions(N, p, rng):
+    if N <= 0 or p <= 0:
+        return np.zeros(0, dtype=np.int64)
+    if p >= 1:
+        return np.arange(N, dtype=np.int64)
+    mean = N*p
+    pos = np.cumsum(rng.geometric(p, size=int(mean + 6*np.sqrt(mean) + 10)).astype(np.int64)) - 1
+    while pos[-1] < N: # rarely, the first draw falls short of the end
+        more = np.cumsum(rng.geometric(p, size=int(6*np.sqrt(mean) + 10)).astype(np.int64)) + pos[-1]
+        pos = np.concatenate((pos, more))
+    return pos[:np.searchsorted(pos, N)]
+
+# Erdos-Renyi: each of the n(n-1)/2 pairs i < j is an edge with probability p. Pair (i, j) is numbered k = j(j-1)/2 + i
+def _er_edges(n, p, rng):
+    k = _bernoulli_positions(n*(n-1)//2, p, rng)
+    j = ((1 + np.sqrt(1 + 8*k.astype(np.float64)))/2).astype(np.int64)
+    j -= j*(j-1)//2 > k # correct the rounding of the square root
+    j += (j+1)*j//2 <= k
+    return k - j*(j-1)//2, j
+
+# nodes split into layers of (nearly) equal size; each pair of nodes in consecutive layers is an edge with probability p
+def _layered_edges(n, p, layers, rng):
+    bounds = np.linspace(0, n, layers+1).astype(np.int64) # layer a is nodes bounds[a]...bounds[a+1]-1
+    sizes = np.diff(bounds)
+    rect = np.zeros(layers, dtype=np.int64) # rect[a] = number of the first pair between layer a and a+1; rect[-1] = total
+    np.cumsum(sizes[:-1]*sizes[1:], out=rect[1:])
+    k = _bernoulli_positions(int(rect[-1]), p, rng)
+    a = np.searchsorted(rect, k, side='right') - 1
+    r = k - rect[a]
+    return bounds[a] + r // sizes[a+1], bounds[a+1] + r % sizes[a+1]
+
+# each node i has min(d, n-1-i) edges, to distinct nodes drawn uniformly from i+1...n-1
+def _out_degree_edges(n, d, rng):
+    nodes = np.arange(n, dtype=np.int64)
+    deg = np.minimum(d, n-1-nodes)
+    full = deg == n-1-nodes # nodes that point to every later node
+    ind = np.repeat(nodes[full], deg[full])
+    dep = np.concatenate([np.arange(i+1, n, dtype=np.int64) for i in nodes[full].tolist()] or [np.zeros(0, dtype=np.int64)])
+    src = np.repeat(nodes[~full], deg[~full])
+    key = np.zeros(0, dtype=np.int64)
+    while len(src): # draw with replacement, then redraw the duplicates
+        dst = src + 1 + (rng.random_sample(len(src))*(n-1-src)).astype(np.int64)
+        key = np.sort(np.concatenate((key, src*n + dst)))
+        dup = np.concatenate(([False], key[1:] == key[:-1]))
+        src = key[dup] // n
+        key = key[~dup]
+    return np.concatenate((ind, key // n)), np.concatenate((dep, key % n))
+
+# Returns the edges of a random DAG on nodes 0...n-1 as two int64 arrays (ind_nodes, dep_nodes), with ind_nodes < dep_nodes. model is 'er'
+# (Erdos-Renyi, each pair with probability p), 'layered' (p between consecutive layers) or 'out_degree' (out_degree distinct later nodes each).
+# With single_root=True, node 0 is the only node without a predecessor
+def random_dag_edges(n, model='er', p=0.1, layers=None, out_degree=3, single_root=True, seed=None):
+    rng = np.random.RandomState(seed)
+    if model == 'er':
+        ind, dep = _er_edges(n, p, rng)
+    elif model == 'layered':
+        ind, dep = _layered_edges(n, p, layers or max(1, int(np.sqrt(n))), rng)
+    elif model == 'out_degree':
+        ind, dep = _out_degree_edges(n, out_degree, rng)
     else:
-        continue
-#if there are any independent nodes (other than the first), add a dependency
-while dag1.ind_nodes() != [0]:
-    i = dag1.ind_nodes()[-1]
-    if i != 1: dag1.add_edge(randrange(0,i-1),i)
-    elif i == 1: dag1.add_edge(0,i)
-
-print dag1.graph
+        raise ValueError('unknown model %r' % (model,))
+    if single_root and n > 1:
+        orphans = np.flatnonzero(np.bincount(dep, minlength=n) == 0)[1:] # every node but 0 without a predecessor
+        parents = (rng.random_sample(len(orphans))*orphans).astype(np.int64) # uniform in 0...orphan-1
+        ind, dep = np.concatenate((ind, parents)), np.concatenate((dep, orphans))
+    return ind, dep
+
+# random_dag_edges, as a Dag or (frozen=True) as a CSR-backed FrozenDag
+def random_dag(n, model='er', frozen=False, **kwargs):
+    ind, dep = random_dag_edges(n, model, **kwargs)
+    if frozen:
+        return FrozenDag.from_arrays(ind, dep, n)
+    return Dag.from_arrays(ind, dep, nodes=range(n))
+
+
+if __name__ == '__main__':
+    #Construct a random DAG, one edge attempt at a time
+    n = 10 # no. of nodes
+    p = 0.2 # probability of adding an edge
+    m = 50 # max. no. of edge-adding attempts
+    dag1 = Dag()
+    for i in range(n):
+        dag1.add_node(i)
+    for i in range(m):
+        addedge = np.random.choice(a=[True, False], p=[p,1-p])
+        if addedge:
+            j = randrange(0,n-2)
+            k = j
+            while k <= j:
+                k = randrange(0,n-1)
+            dag1.add_edge(j,k)
+        else:
+            continue
+    #if there are any independent nodes (other than the first), add a dependency
+    while dag1.ind_nodes() != [0]:
+        i = dag1.ind_nodes()[-1]
+        if i != 1: dag1.add_edge(randrange(0,i-1),i)
+        elif i == 1: dag1.add_edge(0,i)
+
+    print dag1.graph
+
+    #The same in one vectorised draw, for each model
+    for model in ('er', 'layered', 'out_degree'):
+        dag2 = random_dag(n, model, p=p, layers=3, out_degree=2, seed=1)
+        print model, dag2.graph, dag2.ind_nodes()
+
+    #Load-test sized graphs, as CSR arrays
+    n = 10**6
+    for model, kwargs in (('er', {'p': 4.0/n}), ('layered', {'p': 4.0/1000, 'layers': 1000}), ('out_degree', {'out_degree': 4})):
+        t0 = default_timer()
+        fdag = random_dag(n, model, frozen=True, seed=1, **kwargs)
+        print "n = 10^6, %s: %i edges in %.3f s, independent nodes %s" % (model, fdag.n_edges(), default_timer() - t0, fdag.ind_nodes())
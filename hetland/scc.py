@@ -0,0 +1,82 @@
+'''
+Python script for finding the strongly connected components (SCCs) of a directed graph, and for building its condensation.
+An SCC is a maximal set of nodes that can all reach one another; a graph is acyclic exactly when every SCC is a single node. Contracting each SCC
+to one node gives the condensation, which is always a DAG, so a graph that fails Dag.validate() (or for which topsort returns None) can still be
+scheduled: its SCCs are run in the topological order of the condensation, the members of each SCC together.
+'''
+
+import random
+from dag import Dag
+
+# Tarjan's algorithm, iteratively. G is a dict of sets (e.g. Dag.graph); every node must be a key. index[u] is the order in which u was discovered,
+# low[u] the smallest index reachable from u through its DFS subtree plus one back edge. u is the root of an SCC when low[u] == index[u], and the SCC
+# is then everything above u on the stack. The explicit work stack of (node, iterator over its out-edges) pairs removes the recursion limit.
+# Returns the SCCs as lists of nodes, in reverse topological order of the condensation (an SCC is only completed after all those it points to)
+def strongly_connected_components(G):
+    index, low = {}, {}
+    stack, on_stack = [], set()
+    comps = []
+    for s in G:
+        if s in index: continue
+        index[s] = low[s] = len(index)
+        stack.append(s)
+        on_stack.add(s)
+        work = [(s, iter(G[s]))]
+        while work:
+            u, it = work[-1]
+            for v in it:
+                if v not in index: # tree edge, descend
+                    index[v] = low[v] = len(index)
+                    stack.append(v)
+                    on_stack.add(v)
+                    work.append((v, iter(G[v])))
+                    break
+                elif v in on_stack: # edge back into the current SCC candidate
+                    low[u] = min(low[u], index[v])
+            else: # u finished
+                work.pop()
+                if work:
+                    p = work[-1][0]
+                    low[p] = min(low[p], low[u])
+                if low[u] == index[u]:
+                    comp = []
+                    while True:
+                        v = stack.pop()
+                        on_stack.remove(v)
+                        comp.append(v)
+                        if v == u: break
+                    comps.append(comp)
+    return comps
+
+# Builds the condensation of G as a Dag whose nodes are the SCC ids 0...k-1, numbered in topological order. Returns (dag, comp_of, members), where
+# comp_of maps each node of G to its SCC id and members[c] lists the nodes of SCC c
+def condensation(G):
+    members = strongly_connected_components(G)
+    members.reverse() # topological order
+    comp_of = {}
+    for c, comp in enumerate(members):
+        for u in comp:
+            comp_of[u] = c
+    edges = set((comp_of[u], comp_of[v]) for u in G for v in G[u] if comp_of[u] != comp_of[v])
+    dag = Dag.from_edges(edges, nodes=range(len(members)))
+    return dag, comp_of, members
+
+
+if __name__ == '__main__':
+    #Driver code
+    #Random graph with cycles, as built in dfs.py without online order
+    random.seed(18)
+    dag1 = Dag()
+    for i in range(10):
+        dag1.add_node(i)
+    for i in range(20):
+        dag1.add_edge(random.randint(0,9), random.randint(0,9))
+    print(dag1.graph)
+    print(dag1.validate())
+    comps = strongly_connected_components(dag1.graph)
+    print(comps)
+    cdag, comp_of, members = condensation(dag1.graph)
+    print(cdag.graph)
+    print(cdag.validate())
+    #schedule: SCCs in topological order of the condensation
+    print([members[c] for c in cdag.topological_sort()])
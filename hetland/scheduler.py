@@ -0,0 +1,139 @@
+'''
+Python script for executing the nodes of a directed acyclic graph (Dag) in parallel, each node being run as soon as
+all of the nodes it depends on have finished.
+The bookkeeping is that of the Kahn topological sort (see Dag.topological_sort): each node holds a count of its
+unfinished predecessors, and a node whose count drops to zero is handed to a thread or process pool straight away.
+Per-node timings are recorded, from which the critical path (the longest chain of dependent work, which bounds the
+achievable parallel speedup) is found.
+'''
+
+import pickle
+import sys
+import time
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
+try:
+    from queue import Queue
+except ImportError:
+    from Queue import Queue
+
+from dag import Dag
+
+# Runs one task in a worker. Exceptions are returned rather than raised, so that they reach the scheduler. In a process
+# pool (check_pickle=True) a result that cannot be pickled is also returned as an error: the pool would otherwise fail
+# to send it back, and the success callback the scheduler waits on would never fire
+def _run_task(func, args, check_pickle=False):
+    start = time.time()
+    try:
+        result, failed = func(*args), False
+        if check_pickle:
+            pickle.dumps(result, pickle.HIGHEST_PROTOCOL)
+    except Exception as e:
+        result, failed = e, True
+    return result, failed, start, time.time()
+
+class ScheduleResult(object):
+
+    def __init__(self, results, start, finish, wall_time, order):
+        self.results = results # node -> return value of its task
+        self.start = start # node -> start time (seconds since the start of the run)
+        self.finish = finish # node -> finish time
+        self.wall_time = wall_time
+        self.order = order # nodes in order of completion (a topological order)
+
+    def duration(self, node):
+        return self.finish[node] - self.start[node]
+
+    # total time spent in tasks, i.e. the run time on a single worker
+    def total_work(self):
+        return sum(self.duration(node) for node in self.order)
+
+    # returns (length, nodes) of the critical path: the chain of dependent nodes with the largest summed duration
+    def critical_path(self, dag):
+        length, via = {}, {}
+        for node in self.order: # completion order, so predecessors are always done first
+            best = None
+            for p in dag.predecessors(node):
+                if best is None or length[p] > length[best]:
+                    best = p
+            via[node] = best
+            length[node] = self.duration(node) + (length[best] if best is not None else 0.0)
+        if not length:
+            return 0.0, []
+        node = max(length, key=length.get)
+        total = length[node]
+        path = []
+        while node is not None:
+            path.append(node)
+            node = via[node]
+        path.reverse()
+        return total, path
+
+# Runs every node of the Dag on a pool of workers, respecting the dependencies. tasks is either a single callable,
+# called as tasks(node), or a mapping node -> callable taking no arguments. With processes=True a process pool is
+# used, otherwise a thread pool. Raises ValueError if the graph is not acyclic, and re-raises the first exception
+# raised by a task (no further tasks are started after a failure). With processes=True, tasks and their results must be
+# picklable: a task that is not is rejected (with the pickling error) before it is submitted, and a result that is not
+# is reported as the task's error. On Python 3 any other failure inside the pool is passed back by an error callback
+def run_dag(dag, tasks, workers=None, processes=False):
+    graph = dag.graph
+    in_degree = dict((u, len(dag.predecessors(u))) for u in graph)
+    done = Queue()
+    pool = Pool(workers) if processes else ThreadPool(workers)
+    t0 = time.time()
+
+    def submit(node):
+        if callable(tasks):
+            func, args = tasks, (node,)
+        else:
+            func, args = tasks[node], ()
+        kwargs = {}
+        if processes:
+            pickle.dumps((func, args), pickle.HIGHEST_PROTOCOL) # raises here, rather than failing silently in the pool
+            if sys.version_info[0] >= 3:
+                kwargs['error_callback'] = lambda e: done.put((node, (e, True, None, None)))
+        pool.apply_async(_run_task, (func, args, processes), callback=lambda outcome: done.put((node, outcome)), **kwargs)
+
+    results, start, finish, order = {}, {}, {}, []
+    running = 0
+    try:
+        for u in graph:
+            if in_degree[u] == 0:
+                submit(u)
+                running += 1
+        while running:
+            node, (result, failed, t_start, t_finish) = done.get()
+            running -= 1
+            if failed:
+                raise result
+            results[node] = result
+            start[node], finish[node] = t_start - t0, t_finish - t0
+            order.append(node)
+            for v in graph[node]:
+                in_degree[v] -= 1 # uncount the finished dependency
+                if in_degree[v] == 0:
+                    submit(v)
+                    running += 1
+    finally:
+        pool.terminate()
+    if len(order) != len(graph):
+        raise ValueError('graph is not acyclic')
+    return ScheduleResult(results, start, finish, time.time() - t0, order)
+
+
+if __name__ == '__main__':
+    # Driver code: a diamond of tasks that sleep, on four threads. The critical path is a -> c -> d
+    dag1 = Dag()
+    for node in 'abcd':
+        dag1.add_node(node)
+    dag1.add_edge('a', 'b')
+    dag1.add_edge('a', 'c')
+    dag1.add_edge('b', 'd')
+    dag1.add_edge('c', 'd')
+    delays = {'a': 0.1, 'b': 0.1, 'c': 0.3, 'd': 0.1}
+    res = run_dag(dag1, dict((node, lambda t=delays[node]: time.sleep(t)) for node in delays), workers=4)
+    for node in res.order:
+        print('%s: %.3f - %.3f' % (node, res.start[node], res.finish[node]))
+    length, path = res.critical_path(dag1)
+    print('critical path %s, length %.3f s' % (' -> '.join(path), length))
+    print('wall time %.3f s, total work %.3f s' % (res.wall_time, res.total_work()))
@@ -1,6 +1,13 @@
 '''
 A collection of sorting algorithms
 '''
+
+import random
+from array import array
+from bisect import bisect_left, bisect_right
+from copy import copy
+from timeit import default_timer
+
 # Insertion sort (recursive implementation)
 def ins_sort_rec(seq, i):
     if i == 0: return # base case
@@ -59,29 +66,130 @@ def mergesort(seq):
     res.reverse() # since result is backward
     return (lft or rgt) + res # also add the remainder
 
+# Bottom-up merge sort, without the slicing and list building of mergesort. The input is first cut into natural runs (maximal nondecreasing
+# or strictly decreasing stretches, the latter reversed in place), and runs shorter than _MINRUN are extended by insertion sort. Adjacent runs
+# are then merged pass by pass, alternating between seq and a single auxiliary buffer of the same length (allocated once, or passed in as buf
+# to reuse it between calls), so each pass is one sweep with no allocation. Stable. With key, the keys are computed once and moved alongside
+# the items (in a second buffer). Works on lists, array.array and NumPy arrays. Sorts seq in place and returns it
+_MINRUN = 32
+
+# Cuts keys[0...n-1] into sorted runs (moving vals alongside, if not None), returning the run boundaries [0, ..., n]
+def _natural_runs(keys, vals, n):
+    runs = [0]
+    lo = 0
+    while lo < n:
+        hi = lo + 1
+        if hi < n and keys[hi] < keys[lo]: # strictly decreasing, so reversing keeps equal items in order
+            while hi < n and keys[hi] < keys[hi-1]: hi += 1
+            i, j = lo, hi - 1
+            while i < j:
+                keys[i], keys[j] = keys[j], keys[i]
+                if vals is not None: vals[i], vals[j] = vals[j], vals[i]
+                i += 1
+                j -= 1
+        else:
+            while hi < n and not keys[hi] < keys[hi-1]: hi += 1
+        if hi - lo < _MINRUN and hi < n: # extend the run by insertion sort
+            end = min(lo + _MINRUN, n)
+            for i in range(hi, end):
+                x = keys[i]
+                if vals is not None: v = vals[i]
+                j = i
+                while j > lo and x < keys[j-1]:
+                    keys[j] = keys[j-1]
+                    if vals is not None: vals[j] = vals[j-1]
+                    j -= 1
+                keys[j] = x
+                if vals is not None: vals[j] = v
+            hi = end
+        runs.append(hi)
+        lo = hi
+    return runs
+
+# Stable merge of the sorted runs src[lo...mid-1] and src[mid...hi-1] into dst[lo...hi-1] (moving vsrc into vdst alongside, if not None)
+def _merge_runs(src, dst, vsrc, vdst, lo, mid, hi):
+    i, j, k = lo, mid, lo
+    if mid == hi or not src[mid] < src[mid-1]: # already in order (or nothing to merge with): both runs are copied below
+        pass
+    elif vsrc is None:
+        while i < mid and j < hi:
+            if src[j] < src[i]:
+                dst[k] = src[j]
+                j += 1
+            else:
+                dst[k] = src[i]
+                i += 1
+            k += 1
+    else:
+        while i < mid and j < hi:
+            if src[j] < src[i]:
+                dst[k], vdst[k] = src[j], vsrc[j]
+                j += 1
+            else:
+                dst[k], vdst[k] = src[i], vsrc[i]
+                i += 1
+            k += 1
+    for a, b in ((i, mid), (j, hi)): # copy what is left of either run
+        while a < b:
+            dst[k] = src[a]
+            if vsrc is not None: vdst[k] = vsrc[a]
+            a += 1
+            k += 1
+
+def mergesort_bu(seq, key=None, buf=None):
+    n = len(seq)
+    if key is None:
+        keys, vals = seq, None
+    else:
+        keys, vals = [key(x) for x in seq], seq
+    runs = _natural_runs(keys, vals, n)
+    if len(runs) <= 2: return seq # a single run
+    if buf is None: buf = copy(seq)
+    if vals is None:
+        src, dst, vsrc, vdst = keys, buf, None, None
+    else:
+        src, dst, vsrc, vdst = keys, copy(keys), vals, buf
+    while len(runs) > 2:
+        merged = [0]
+        for r in range(0, len(runs)-2, 2):
+            _merge_runs(src, dst, vsrc, vdst, runs[r], runs[r+1], runs[r+2])
+            merged.append(runs[r+2])
+        if len(runs) % 2 == 0: # odd number of runs, the last is copied over
+            _merge_runs(src, dst, vsrc, vdst, runs[-2], n, n)
+            merged.append(n)
+        runs = merged
+        src, dst, vsrc, vdst = dst, src, vdst, vsrc
+    if vals is None:
+        if src is not seq: seq[:] = src
+    elif vsrc is not seq:
+        seq[:] = vsrc
+    return seq
+
 # Quicksort
 # Hoare partitioning scheme - more efficient for average case
 def hoare_partition(seq, lo, hi):
     piv = seq[lo]
     i = lo - 1 # idx at lower end of array
     j = hi + 1 # idx at upper end of array
-    # indices move towards one another until they correspond to a pair of elems both on the wrong side of the pivot
+    # indices move towards one another until they correspond to a pair of elems both on the wrong side of the pivot, which are swapped.
+    # Both scans stop at elems equal to the pivot, so neither runs off the array and duplicates are spread over both sides
     while True:
+        i += 1
+        while seq[i] < piv: i += 1
         j -= 1
-        while seq[j] <= piv:
-            i += 1
-            while seq[i] >= piv:
-                if i < j:
-                    seq[i], seq[j] = seq[j], seq[i]
-                    break
-                else:
-                    return j
+        while seq[j] > piv: j -= 1
+        if i >= j: return j # seq[lo...j] <= piv <= seq[j+1...hi], with lo <= j < hi
+        seq[i], seq[j] = seq[j], seq[i]
 def quicksort_hoare(seq, lo=0, hi=None):
     if hi is None: hi = len(seq)-1
-    if lo < hi:
+    while lo < hi:
         p = hoare_partition(seq, lo, hi)
-        quicksort_hoare(seq, lo, p)
-        quicksort_hoare(seq, p+1, hi)
+        if p - lo < hi - p: # recurse on the smaller part, loop on the larger, so the recursion is at most log2(n) deep
+            quicksort_hoare(seq, lo, p)
+            lo = p + 1
+        else:
+            quicksort_hoare(seq, p+1, hi)
+            hi = p
     return seq
 # Lomuto partitioning scheme - always choose last elem to be pivot
 def lomuto_partition(seq, lo, hi):
@@ -103,6 +211,40 @@ def quicksort_lomuto(seq, lo=0, hi=None):
         quicksort_lomuto(seq, p+1, hi)
     return seq
 
+# Three-way (Dutch national flag) quicksort - all elems equal to the pivot are put in place at once, so inputs with many duplicates
+# with only k distinct values take O(n log k) on average, rather than degrading as the two-way schemes can. The partitioning of seq[lo...hi]
+# about the value piv returns (lt, gt) such that seq[lo...lt-1] < piv,
+# seq[lt...gt] == piv and seq[gt+1...hi] > piv
+def _partition3(seq, lo, hi, piv):
+    lt, i, gt = lo, lo, hi
+    while i <= gt:
+        x = seq[i]
+        if x < piv:
+            seq[lt], seq[i] = x, seq[lt]
+            lt += 1
+            i += 1
+        elif piv < x:
+            seq[i], seq[gt] = seq[gt], x
+            gt -= 1
+        else:
+            i += 1
+    return lt, gt
+def quicksort_3way(seq, lo=0, hi=None):
+    if hi is None: hi = len(seq)-1
+    while hi - lo >= _CUTOFF:
+        # median of three random elems: the partitioning does not keep the order of the elems > piv, so fixed positions (first,
+        # middle, last) pick poor pivots on the already partitioned parts of sorted input
+        piv = sorted(seq[random.randint(lo, hi)] for i in range(3))[1]
+        lt, gt = _partition3(seq, lo, hi, piv)
+        if lt - lo < hi - gt:
+            quicksort_3way(seq, lo, lt-1)
+            lo = gt + 1
+        else:
+            quicksort_3way(seq, gt+1, hi)
+            hi = lt - 1
+    _ins_sort_range(seq, lo, hi)
+    return seq
+
 #Quicksort - alternative implementation
 def partition(seq):
     pi, seq = seq[0], seq[1:]
@@ -125,19 +267,244 @@ def select(seq, k):
         return select(lo,k)
 
 
-# Driver code
-#seq = [ 170, 45, 75, 90, 802, 24, 2, 66]
-seq = [ 3, 7, 8, 5, 2, 1, 9, 5, 4]
-seq = [ 2, 8, 7, 1, 3, 5, 6, 4]
-print seq
-#ins_sort_rec(seq, len(seq)-1)
-#ins_sort(seq)
-#sel_sort_rec(seq, len(seq)-1)
-#sel_sort(seq)
-#gnomesort(seq)
-#seq = mergesort(seq)
-#seq = quicksort_lomuto(seq)
-seq = quicksort_hoare(seq)
-#seq = quicksort2(seq)
-#print select(seq,3)
-print seq
+# Introsort: the production sort, combining the above. Quicksort with a median-of-three pivot and Hoare partitioning does the bulk of the
+# work; slices of at most _CUTOFF elements are left to insertion sort, which is fastest on small inputs; and if the quicksort recursion goes
+# deeper than 2 log2(n), which only happens on adversarial inputs, the slice is heapsorted instead, so the worst case is O(n log n). Only indices
+# are passed around (no slicing), the recursion is on the smaller part only (so at most log2(n) deep) and an already sorted input is detected
+# in one O(n) pass. Sorts seq[lo...hi] (inclusive) in place and returns seq
+_CUTOFF = 16
+
+# Insertion sort of seq[lo...hi], moving each element into a hole rather than swapping
+def _ins_sort_range(seq, lo, hi):
+    for i in range(lo+1, hi+1):
+        x = seq[i]
+        j = i
+        while j > lo and seq[j-1] > x:
+            seq[j] = seq[j-1]
+            j -= 1
+        seq[j] = x
+
+# Heapsort of seq[lo...hi]: build a max-heap, then repeatedly swap the largest element to the end
+def _sift_down(seq, lo, root, end): # heap occupies seq[lo...end-1], root is an offset from lo
+    x = seq[lo+root]
+    child = 2*root + 1
+    while child < end - lo:
+        if child + 1 < end - lo and seq[lo+child] < seq[lo+child+1]: child += 1
+        if not x < seq[lo+child]: break
+        seq[lo+root] = seq[lo+child]
+        root, child = child, 2*child + 1
+    seq[lo+root] = x
+def heapsort(seq, lo=0, hi=None):
+    if hi is None: hi = len(seq)-1
+    n = hi - lo + 1
+    for root in range(n//2 - 1, -1, -1):
+        _sift_down(seq, lo, root, hi+1)
+    for end in range(hi, lo, -1):
+        seq[lo], seq[end] = seq[end], seq[lo]
+        _sift_down(seq, lo, 0, end)
+    return seq
+
+# Hoare partitioning of seq[lo...hi] about the median of seq[lo], seq[mid], seq[hi]. Sorting those three in place puts an element <= pivot at
+# lo and one >= pivot at hi, so neither scan can run off the slice. Returns p such that seq[lo...p] <= pivot <= seq[p+1...hi], lo <= p < hi
+def _median3_partition(seq, lo, hi):
+    mid = (lo + hi) // 2
+    if seq[mid] < seq[lo]: seq[lo], seq[mid] = seq[mid], seq[lo]
+    if seq[hi] < seq[lo]: seq[lo], seq[hi] = seq[hi], seq[lo]
+    if seq[hi] < seq[mid]: seq[mid], seq[hi] = seq[hi], seq[mid]
+    piv = seq[mid]
+    i, j = lo, hi
+    while True:
+        i += 1
+        while seq[i] < piv: i += 1
+        j -= 1
+        while piv < seq[j]: j -= 1
+        if i >= j: return j
+        seq[i], seq[j] = seq[j], seq[i]
+
+def _introsort(seq, lo, hi, depth):
+    while hi - lo >= _CUTOFF:
+        if depth == 0:
+            heapsort(seq, lo, hi)
+            return
+        depth -= 1
+        p = _median3_partition(seq, lo, hi)
+        if p - lo < hi - p: # recurse on the smaller part, loop on the larger
+            _introsort(seq, lo, p, depth)
+            lo = p + 1
+        else:
+            _introsort(seq, p+1, hi, depth)
+            hi = p
+    _ins_sort_range(seq, lo, hi)
+
+def introsort(seq, lo=0, hi=None):
+    if hi is None: hi = len(seq)-1
+    for i in range(lo, hi):
+        if seq[i+1] < seq[i]: break
+    else:
+        return seq # already sorted
+    _introsort(seq, lo, hi, 2*(hi - lo + 1).bit_length())
+    return seq
+
+# Introselect: in-place selection of the (k+1)th lowest element, without the list copies of select. Quickselect with the median-of-three Hoare
+# partitioning of introsort narrows seq[lo...hi] down to the side holding index k; if that takes more than 2 log2(n) partitions, the rest is
+# done with the median of medians as the pivot, which guarantees linear time. On return seq[k] is the element that would be there if seq were
+# sorted, with smaller (or equal) elements before it and larger (or equal) ones after it
+
+# Median of medians of groups of five: each group is sorted, its median moved to the front of the slice, and the median of those found by
+# selection. At least ~3/10 of the slice lies on either side of it
+def _mom_pivot(seq, lo, hi):
+    m = lo
+    for g in range(lo, hi+1, 5):
+        end = min(g+4, hi)
+        _ins_sort_range(seq, g, end)
+        mid = (g + end) // 2
+        seq[m], seq[mid] = seq[mid], seq[m]
+        m += 1
+    return _select(seq, lo, m-1, (lo + m - 1) // 2, 0)
+
+def _select(seq, lo, hi, k, depth):
+    while hi - lo >= _CUTOFF:
+        if depth > 0:
+            depth -= 1
+            p = _median3_partition(seq, lo, hi)
+            if k <= p: hi = p
+            else: lo = p + 1
+        else:
+            lt, gt = _partition3(seq, lo, hi, _mom_pivot(seq, lo, hi))
+            if k < lt: hi = lt - 1
+            elif k > gt: lo = gt + 1
+            else: return seq[k]
+    _ins_sort_range(seq, lo, hi)
+    return seq[k]
+
+def introselect(seq, k, lo=0, hi=None):
+    if hi is None: hi = len(seq)-1
+    if not lo <= k <= hi: raise IndexError('k out of range')
+    return _select(seq, lo, hi, k, 2*(hi - lo + 1).bit_length())
+
+# Several order statistics in one pass (multiselect): each partition step sends the wanted indices to the side they fall on, and a part with
+# no wanted index is never looked at again, so the cost grows with log(len(ks)) rather than len(ks). Returns [seq[k] for k in ks] as they
+# would be if seq were sorted; seq is reordered in place
+def select_many(seq, ks, lo=0, hi=None):
+    if hi is None: hi = len(seq)-1
+    order = sorted(set(ks))
+    if order and not lo <= order[0] <= order[-1] <= hi: raise IndexError('k out of range')
+    stack = [(lo, hi, 0, len(order), 2*(hi - lo + 1).bit_length())]
+    while stack:
+        lo, hi, a, b, depth = stack.pop() # order[a...b-1] are the wanted indices within seq[lo...hi]
+        if a == b: continue
+        if b - a == 1:
+            _select(seq, lo, hi, order[a], depth)
+        elif hi - lo < _CUTOFF:
+            _ins_sort_range(seq, lo, hi)
+        elif depth > 0:
+            p = _median3_partition(seq, lo, hi)
+            c = bisect_right(order, p, a, b)
+            stack.append((lo, p, a, c, depth-1))
+            stack.append((p+1, hi, c, b, depth-1))
+        else:
+            lt, gt = _partition3(seq, lo, hi, _mom_pivot(seq, lo, hi))
+            stack.append((lo, lt-1, a, bisect_left(order, lt, a, b), 0))
+            stack.append((gt+1, hi, bisect_right(order, gt, a, b), b, 0))
+    return [seq[k] for k in ks]
+
+# Nearest-rank percentiles (p in 0...100) of a non-empty seq: the smallest element with at least p% of seq at or below it. seq is reordered
+# in place; pass a copy to keep the original order
+def percentiles(seq, ps):
+    n = len(seq)
+    ks = [min(n-1, max(0, -(-p*n // 100) - 1)) for p in ps] # ceil(p n / 100) - 1
+    return select_many(seq, [int(k) for k in ks])
+
+# Times each sort function on a copy of each input; sort functions that return the result (rather than sorting in place) are marked in
+# returns. Prints the time taken, or why the function failed (e.g. the recursion limit of the recursive quicksorts on sorted input)
+def benchmark(funcs, inputs, returns=()):
+    for name, data in inputs:
+        expected = sorted(data)
+        for func in funcs:
+            seq = list(data)
+            t0 = default_timer()
+            try:
+                res = func(seq)
+            except RuntimeError as e: # RecursionError
+                print "%-10s %-16s failed: %s" % (name, func.__name__, str(e)[:40])
+                continue
+            t = default_timer() - t0
+            if func not in returns: res = seq
+            print "%-10s %-16s %8.4f s%s" % (name, func.__name__, t, "" if res == expected else "  WRONG")
+
+# Property check: each in-place sort function is run on random inputs of random length (up to 100), drawn from a small or a large range of
+# values, sorted, reversed or shuffled, and the result compared with sorted(). Returns the number of inputs checked, or raises AssertionError
+def check_sorts(funcs, trials=1000):
+    for trial in range(trials):
+        n = random.randint(0, 100)
+        data = [random.randint(0, random.choice([1, 3, 10**6])) for i in range(n)]
+        shape = random.randint(0, 2)
+        if shape == 1: data.sort()
+        elif shape == 2: data.sort(reverse=True)
+        expected = sorted(data)
+        for func in funcs:
+            seq = list(data)
+            func(seq)
+            assert seq == expected, (func.__name__, data)
+    return trials
+
+def benchmark_inputs(n):
+    data = [random.random() for i in range(n)]
+    return [('random', data), ('sorted', sorted(data)), ('reversed', sorted(data, reverse=True)),
+            ('duplicates', [random.randint(0, 9) for i in range(n)])]
+
+
+if __name__ == '__main__':
+    # Driver code
+    #seq = [ 170, 45, 75, 90, 802, 24, 2, 66]
+    seq = [ 3, 7, 8, 5, 2, 1, 9, 5, 4]
+    seq = [ 2, 8, 7, 1, 3, 5, 6, 4]
+    print seq
+    #ins_sort_rec(seq, len(seq)-1)
+    #ins_sort(seq)
+    #sel_sort_rec(seq, len(seq)-1)
+    #sel_sort(seq)
+    #gnomesort(seq)
+    #seq = mergesort(seq)
+    #seq = quicksort_lomuto(seq)
+    seq = quicksort_hoare(seq)
+    #seq = quicksort2(seq)
+    #print select(seq,3)
+    print seq
+    seq = [ 2, 8, 7, 1, 3, 5, 6, 4]
+    print introsort(seq)
+    seq = [ 2, 8, 7, 1, 3, 5, 6, 4]
+    print select(seq, 3), introselect(seq, 3), seq
+
+    # p50/p90/p99 of 10^6 latencies, in one pass over the array, against sorting it
+    latencies = array('d', (random.expovariate(1.0) for i in range(10**6)))
+    data = array('d', latencies)
+    t0 = default_timer()
+    p = percentiles(data, [50, 90, 99])
+    t1 = default_timer()
+    s = sorted(latencies)
+    t2 = default_timer()
+    print "p50/p90/p99 %s: percentiles %.3f s, sorted %.3f s, same: %s" % (p, t1 - t0, t2 - t1, p == [s[499999], s[899999], s[989999]])
+    data = sorted(latencies) # worst case for select (first element as pivot); introselect is unaffected
+    t0 = default_timer()
+    print "sorted input: percentiles %s in %.3f s" % (percentiles(data, [50, 90, 99]), default_timer() - t0)
+
+    random.seed(1)
+    print "random inputs against sorted():", check_sorts([introsort, heapsort, mergesort_bu, quicksort_hoare, quicksort_lomuto, quicksort_3way])
+    print "n = 1000"
+    benchmark([sorted, introsort, heapsort, ins_sort, sel_sort, gnomesort, mergesort, quicksort_hoare, quicksort_lomuto, quicksort_3way,
+               quicksort2],
+              benchmark_inputs(1000), returns=(sorted, mergesort, quicksort2))
+    print "n = 10^5"
+    benchmark([sorted, introsort, heapsort, mergesort, mergesort_bu, quicksort_3way], benchmark_inputs(10**5),
+              returns=(sorted, mergesort))
+
+    # sorting records by a key, and typed arrays reusing one buffer
+    records = [(random.randint(0, 9), i) for i in range(10)]
+    print mergesort_bu(records, key=lambda r: r[0]) # stable: equal keys keep ascending i
+    data, buf = array('d'), array('d', [0.0]*10**5)
+    for i in range(3):
+        data[:] = array('d', (random.random() for j in range(10**5)))
+        t0 = default_timer()
+        mergesort_bu(data, buf=buf)
+        print "array('d') n = 10^5: mergesort_bu %.4f s, sorted: %s" % (default_timer() - t0, list(data) == sorted(data))
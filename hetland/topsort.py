@@ -10,6 +10,9 @@ except ImportError:
     from ordereddict import OrderedDict
 
 from copy import deepcopy
+from heapq import heappush, heappop
+from random import randrange, seed
+from timeit import default_timer
 
 # naive topological sorting algorithm
 def naive_topsort(G, S=None):
@@ -48,6 +51,77 @@ def topsort(G):
         return S
     return S
 
+# priority-aware topological sorting algorithm (Kahn algorithm with a heap)
+'''topsort pops whichever valid start node was appended last, so among the nodes that are ready the output order is arbitrary. Keeping the ready nodes in a
+heap instead always emits the ready node with the smallest key(u) (by default the node itself, e.g. smallest id first; use key=lambda u: -w[u] for
+highest weight first), which gives a deterministic order in O((V+E) log V). Ties are broken by the order in which nodes became ready'''
+
+def priority_topsort(G, key=None):
+    if key is None: key = lambda u: u
+    count = dict((u,0) for u in G) # in-degree for each node
+    for u in G:
+        for v in G[u]:
+            count[v] += 1
+    Q = [] # heap of (key, tie-breaker, node)
+    i = 0
+    for u in G:
+        if count[u] == 0:
+            heappush(Q, (key(u), i, u))
+            i += 1
+    S = [] # the result
+    while Q:
+        u = heappop(Q)[2]
+        S.append(u)
+        for v in G[u]:
+            count[v] -= 1
+            if count[v] == 0:
+                heappush(Q, (key(v), i, v))
+                i += 1
+    if len(S) != len(G): # graph is not a valid DAG
+        return None
+    return S
+
+# DFS-based topological sorting algorithm
+'''a node can only be finished (all of its descendants explored) once everything reachable from it has been finished, so listing the nodes in
+reverse order of finishing gives a valid topological sequence. An edge to a node that is still on the stack means that there is a cycle. The
+stack holds (node, iterator over its out-edges) pairs, so depth is not limited by the recursion limit'''
+
+def dfs_topsort(G):
+    state = {} # 1 = on the stack, 2 = finished
+    S = [] # nodes in order of finishing
+    for s in G:
+        if s in state: continue
+        state[s] = 1
+        stack = [(s, iter(G[s]))]
+        while stack:
+            u, it = stack[-1]
+            for v in it:
+                if v not in state:
+                    state[v] = 1
+                    stack.append((v, iter(G[v])))
+                    break
+                if state[v] == 1: # back edge, graph is not a valid DAG
+                    return None
+            else: # all out-edges of u explored
+                stack.pop()
+                state[u] = 2
+                S.append(u)
+    S.reverse()
+    return S
+
+# Production entry point: same input G as naive_topsort (any mapping from each node to an iterable of the nodes it points to), but runs
+# iteratively in O(V+E) and never copies G. Returns None if G is not a valid DAG. method is 'kahn', 'dfs' or None to choose automatically:
+# sparse graphs (fewer edges than nodes - forests and chains, where DFS needs no separate in-degree pass) use the DFS order, others Kahn's algorithm
+def iter_topsort(G, method=None):
+    if method is None:
+        n_edges = sum(len(G[u]) for u in G)
+        method = 'dfs' if n_edges < len(G) else 'kahn'
+    if method == 'dfs':
+        return dfs_topsort(G)
+    elif method == 'kahn':
+        return topsort(G)
+    raise ValueError('unknown topological sort method %s' % method)
+
 '''
 0 - b
 1 - a
@@ -58,12 +132,39 @@ def topsort(G):
 Therefore correct order: 1, 0, 5, 4, 3, 2
 For this graph, the topological ordered sequence is a unique solution
 '''
-#Driver code
-#Example graph
-G = OrderedDict([(0, set([5, 4, 2])), (1, set([0, 2])), (2, set([])), (3, set([2])), (4, set([2, 3])), (5, set([4]))])
-#correct order: 1, 0, 5, 4, 3, 2
-print G
-seq = naive_topsort(G)
-print seq
-seq = topsort(G)
-print seq
+if __name__ == '__main__':
+    #Driver code
+    #Example graph
+    G = OrderedDict([(0, set([5, 4, 2])), (1, set([0, 2])), (2, set([])), (3, set([2])), (4, set([2, 3])), (5, set([4]))])
+    #correct order: 1, 0, 5, 4, 3, 2
+    print G
+    seq = naive_topsort(G)
+    print seq
+    seq = topsort(G)
+    print seq
+    seq = iter_topsort(G, method='dfs')
+    print seq
+    #long chain, far beyond the recursion limit of naive_topsort
+    chain = OrderedDict((i, set([i+1])) for i in range(100000))
+    chain[100000] = set()
+    seq = iter_topsort(chain)
+    print seq[:5], seq[-5:]
+    seq = priority_topsort(G) # smallest id first
+    print seq
+    seq = priority_topsort(G, key=lambda u: -u) # largest id first
+    print seq
+
+    #Benchmark: list-based topsort against the heap-based priority_topsort on a random DAG (edges point from lower to higher ids)
+    seed(1)
+    n, m = 20000, 100000
+    R = OrderedDict((u, set()) for u in range(n))
+    for k in range(m):
+        u = randrange(n-1)
+        R[u].add(randrange(u+1, n))
+    for name, sort in (('topsort', topsort), ('priority_topsort', priority_topsort), ('priority_topsort, weights', lambda G: priority_topsort(G, key=lambda u: -(u % 97)))):
+        best = float('inf')
+        for rep in range(3):
+            t = default_timer()
+            sort(R)
+            best = min(best, default_timer() - t)
+        print '%-26s %.4f s' % (name, best)
@@ -2,6 +2,16 @@
 Python scripts for walking through connected component of a graph and for finding connected components
 '''
 
+from array import array
+try:
+    import numpy as np
+except ImportError:
+    np = None # walk_csr requires numpy
+try:
+    xrange
+except NameError:
+    xrange = range
+
 
 # Components function wraps the walk function in a loop over nodes, in order to find (and traverse) all connected components of the graph
 def components(G):
@@ -14,8 +24,45 @@ def components(G):
         comp.append(C) # collect the components
     return comp
 
+# Union-find (disjoint set) components for integer nodes 0...n-1. edges may be any iterable of (u, v) pairs - e.g. a generator reading an edge file - and
+# is consumed once, so no adjacency sets are built and memory is O(n) whatever the number of edges. Edges are treated as undirected. Uses union by
+# rank and path compression, and returns a compact label array: label[v] is the component of v, numbered 0, 1, ... in order of the smallest node
+def uf_labels(edges, n):
+    parent = array('l', xrange(n))
+    rank = bytearray(n) # upper bound on tree height, never exceeds log2(n) < 256
+    def find(x):
+        root = x
+        while parent[root] != root:
+            root = parent[root]
+        while parent[x] != root: # path compression
+            parent[x], x = root, parent[x]
+        return root
+    for u, v in edges:
+        ru, rv = find(u), find(v)
+        if ru == rv: continue
+        if rank[ru] < rank[rv]: ru, rv = rv, ru
+        parent[rv] = ru # attach the shallower tree under the deeper one
+        if rank[ru] == rank[rv]: rank[ru] += 1
+    label = array('l', [-1])*n
+    k = 0
+    for v in xrange(n):
+        r = find(v)
+        if label[r] < 0:
+            label[r] = k
+            k += 1
+        label[v] = label[r]
+    return label
+
+# Components of a graph in the same representation as components(G), via uf_labels. Edge direction is ignored, so nodes joined only by edges pointing
+# the "wrong" way still end up together (components() follows out-edges only). Returns the label array, aligned with list(G)
+def components_uf(G):
+    nodes = list(G)
+    index = dict((u, i) for i, u in enumerate(nodes))
+    return uf_labels(((index[u], index[v]) for u in nodes for v in G[u]), len(nodes))
+
 # Walk function traverses a single connected component of a graph and returns a predecessor map (traversal tree) for the nodes it has visited
-def walk(G, s, S=set()):
+def walk(G, s, S=None):
+    if S is None: S = set() # nodes to be avoided (a mutable default would be shared between calls)
     P, Q = dict(), set() # P keeps track of predecessor nodes (visited), Q is a "to-do" queue
     P[s] = None # start node has no predecessor
     Q.add(s) # we plan on starting with node s
@@ -26,14 +73,92 @@ def walk(G, s, S=set()):
             P[v] = u
     return P
 
+# Allocation-light version of walk for graphs on integer nodes 0...n-1 (G[u] is any iterable of the neighbours of u, e.g. a list of lists or a dict
+# keyed by 0...n-1). Instead of a predecessor dict and a new set per node, it uses a visited bitmap and a frontier (queue) array allocated once up
+# front, and visits in breadth-first order. Returns a compact parent array: parent[s] = s, parent[v] = -1 for nodes not reached
+def walk_ids(G, s, S=None, n=None):
+    if n is None: n = len(G)
+    visited = bytearray(n) # 1 if seen (or to be avoided)
+    if S is not None:
+        for v in S: visited[v] = 1
+    parent = array('l', [-1])*n
+    queue = array('l', [0])*n # each node enters the queue at most once
+    queue[0] = s
+    head, tail = 0, 1
+    visited[s] = 1
+    parent[s] = s
+    while head < tail:
+        u = queue[head]
+        head += 1
+        for v in G[u]:
+            if not visited[v]:
+                visited[v] = 1
+                parent[v] = u
+                queue[tail] = v
+                tail += 1
+    return parent
+
+# Frontier-array BFS on a graph in CSR form (offsets, targets as in dag.FrozenDag: the neighbours of u are targets[offsets[u]:offsets[u+1]]). Each
+# level is expanded with whole-array NumPy operations: the out-edges of every frontier node are gathered at once, already visited targets are
+# masked out, and the first edge to reach each new node becomes its parent. Returns the parent array, with the same conventions as walk_ids
+def walk_csr(offsets, targets, s, S=None):
+    offsets, targets = np.asarray(offsets, dtype=np.int64), np.asarray(targets, dtype=np.int64)
+    n = len(offsets) - 1
+    visited = np.zeros(n, dtype=bool)
+    if S is not None:
+        visited[np.asarray(list(S), dtype=np.int64)] = True
+    parent = np.full(n, -1, dtype=np.int64)
+    visited[s] = True
+    parent[s] = s
+    frontier = np.array([s], dtype=np.int64)
+    while len(frontier):
+        starts = offsets[frontier]
+        degree = offsets[frontier+1] - starts
+        total = degree.sum()
+        if total == 0: break
+        # positions of all out-edges of the frontier: starts[i], starts[i]+1, ..., starts[i]+degree[i]-1 for each i
+        shift = np.repeat(starts - (np.cumsum(degree) - degree), degree)
+        edge = shift + np.arange(total)
+        src, dst = np.repeat(frontier, degree), targets[edge]
+        new = ~visited[dst]
+        src, dst = src[new], dst[new]
+        order = np.argsort(dst, kind='mergesort') # stable, so the first edge found wins
+        src, dst = src[order], dst[order]
+        first = np.ones(len(dst), dtype=bool)
+        first[1:] = dst[1:] != dst[:-1]
+        src, dst = src[first], dst[first]
+        visited[dst] = True
+        parent[dst] = src
+        frontier = dst
+    return parent
+
+# Converts a parent array from walk_ids or walk_csr into the predecessor map returned by walk
+def parents_to_map(parent):
+    P = dict()
+    for v, u in enumerate(parent):
+        if u == v: P[v] = None
+        elif u >= 0: P[v] = int(u)
+    return P
+
+
+if __name__ == '__main__':
+    #Graph representing the bridges of Konigsberg
+    G = {0: set([1,2,3]), 1: set([3]), 2: set([3]), 3: set([])}
+    #G = {0: set([1,2,3]), 1: set([0,3]), 2: set([0,3]), 3: set([1,2,3])}
+    print G
+
+    P = walk(G,2)
+    print P
 
-#Graph representing the bridges of Konigsberg
-G = {0: set([1,2,3]), 1: set([3]), 2: set([3]), 3: set([])}
-#G = {0: set([1,2,3]), 1: set([0,3]), 2: set([0,3]), 3: set([1,2,3])}
-print G
+    tree = components(G)
+    print tree
 
-P = walk(G,2)
-print P
+    labels = components_uf(G)
+    print list(labels)
 
-tree = components(G)
-print tree
+    parent = walk_ids(G, 2)
+    print list(parent), parents_to_map(parent)
+    from dag import FrozenDag
+    F = FrozenDag.from_graph(G) # integer keys 0...3 in order, so ids and nodes coincide
+    parent = walk_csr(F.offsets, F.targets, 0)
+    print parent, parents_to_map(parent)